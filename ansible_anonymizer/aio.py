@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Run the anonymizer from asyncio without blocking the event loop."""
+import asyncio
+import io
+import weakref
+from collections.abc import Generator
+from concurrent.futures import Executor
+from functools import partial
+from string import Template
+from typing import Any, Callable, Optional, TypeVar
+
+from ansible_anonymizer.anonymizer import anonymize_segment, anonymize_struct, iter_segments
+
+T = TypeVar("T")
+
+
+def _chunks(block: str, chunk_size: int) -> Generator[str, None, None]:
+    """Group the segments of a text block, without its comments, in chunks of about chunk_size."""
+    chunk: list[str] = []
+    size = 0
+    # Only split on \n, like hide_comments()
+    for segment in iter_segments(io.StringIO(block, newline="\n"), max_lookahead=0):
+        chunk.append(segment)
+        size += len(segment)
+        if size >= chunk_size:
+            yield "".join(chunk)
+            chunk = []
+            size = 0
+    if chunk:
+        yield "".join(chunk)
+
+
+class AsyncAnonymizer:
+    """
+    The async counterparts of anonymize_text_block() and anonymize_struct().
+
+    The work runs in executor, the default executor of the loop if None. At
+    most max_concurrency jobs run at the same time, the other callers wait
+    for their turn. A text block bigger than chunk_size is anonymized one
+    chunk at a time, so a large input doesn't monopolize the workers.
+    """
+
+    def __init__(
+        self,
+        executor: Optional[Executor] = None,
+        max_concurrency: int = 4,
+        chunk_size: int = 64 * 1024,
+    ) -> None:
+        self.executor = executor
+        self.max_concurrency = max_concurrency
+        self.chunk_size = chunk_size
+        # A semaphore is bound to the loop that uses it first, one per running loop
+        self._semaphores: weakref.WeakKeyDictionary[
+            asyncio.AbstractEventLoop, asyncio.Semaphore
+        ] = weakref.WeakKeyDictionary()
+
+    async def _run(self, func: Callable[[], T]) -> T:
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if not semaphore:
+            # Created in the loop, Python 3.9 binds it to the current loop
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        async with semaphore:
+            return await loop.run_in_executor(self.executor, func)
+
+    async def anonymize_text_block(
+        self, block: str, value_template: Optional[Template] = None
+    ) -> str:
+        """Anonymize a text block, with the same result as the synchronous function."""
+        if not value_template:
+            value_template = Template("{{ $variable_name }}")
+        results = [
+            await self._run(partial(anonymize_segment, chunk, value_template))
+            for chunk in _chunks(block, self.chunk_size)
+        ]
+        return "".join(results)
+
+    async def anonymize_struct(
+        self, o: Any, key_name: str = "", value_template: Optional[Template] = None
+    ) -> Any:
+        """Anonymize a structure, with the same result as the synchronous function."""
+        return await self._run(
+            partial(anonymize_struct, o, key_name=key_name, value_template=value_template)
+        )
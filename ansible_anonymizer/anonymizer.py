@@ -4,11 +4,11 @@
 # pylint: disable=invalid-name
 import ipaddress
 import re
-from collections.abc import Generator
-from ipaddress import IPv4Address, IPv6Address
+from collections.abc import Generator, Iterable, Iterator
+from ipaddress import IPv4Address, IPv4Network, IPv6Address, IPv6Network
 from re import Match
 from string import Template
-from typing import Any, Optional
+from typing import Any, Optional, Union
 from zlib import crc32
 
 from ansible_anonymizer.field_checks import (
@@ -18,7 +18,10 @@ from ansible_anonymizer.field_checks import (
     is_uuid_string,
 )
 from ansible_anonymizer.jinja2 import str_jinja2_variable_name
-from ansible_anonymizer.parser import flatten, parse_raw_block
+from ansible_anonymizer.networks import NetworkIndex
+from ansible_anonymizer.parser import flatten, parse_raw_block, update_open_quotes
+from ansible_anonymizer.parser_multi_lines import is_multi_lines_header
+from ansible_anonymizer.scanner import RegexDetector, Scanner
 
 from .node import NodeType
 
@@ -71,39 +74,45 @@ common_ipv4_networks = [
 ]
 
 
+# The networks that are not anonymized, see allow_ip_network()
+ipv4_allowlist = NetworkIndex(4, common_ipv4_networks)
+_ipv4_max = 2**32 - 1
+
+
 def redact_ipv4_address(value: IPv4Address) -> IPv4Address:
-    for i in common_ipv4_networks:
-        if value in i:
-            return value
-    try:
-        return value + int(value) % 100
-    except ipaddress.AddressValueError:
+    as_int = int(value)
+    if as_int in ipv4_allowlist:
         return value
+    as_int += as_int % 100
+    if as_int > _ipv4_max:
+        return value
+    return IPv4Address(as_int)
 
 
 common_ipv6_networks = [
     ipaddress.IPv6Network("2001:4860:4860::8888/128"),
     ipaddress.IPv6Network("2001:4860:4860::8844/128"),
 ]
+ipv6_allowlist = NetworkIndex(6, common_ipv6_networks)
+# Keep the first hextet and the 10 lowest bits of the other ones
+_ipv6_redaction_mask = int("ffff" + "03ff" * 7, 16)
 
 
 def redact_ipv6_address(value: IPv6Address) -> IPv6Address:
-    for i in common_ipv6_networks:
-        if value in i:
-            return value
+    as_int = int(value)
+    if as_int in ipv6_allowlist:
+        return value
+    return IPv6Address(as_int & _ipv6_redaction_mask)
 
-    def randomize(block: Match[str]) -> str:
-        field = block.group(0)[1:]
-        as_int = int(field, 16)
-        new_val = as_int % 1024
-        as_hex = hex(new_val)
-        hex_without_0x_prefix = as_hex[2:]
-        return ":" + hex_without_0x_prefix
 
-    new_address = ipaddress.IPv6Address(
-        re.sub(r":[a-z0-9]+", randomize, value.compressed, flags=re.IGNORECASE)
-    )
-    return new_address
+def allow_ip_network(network: Union[str, IPv4Network, IPv6Network]) -> None:
+    """Never anonymize the addresses of this network, e.g: the corporate DNS servers."""
+    if isinstance(network, str):
+        network = ipaddress.ip_network(network, strict=False)
+    if network.version == 4:
+        ipv4_allowlist.add(network)
+    else:
+        ipv6_allowlist.add(network)
 
 
 def redact_ip_address(value: str) -> str:
@@ -121,7 +130,23 @@ def unquote(value: str) -> str:
     return value
 
 
+# Each part of anonymize_text_block() needs one of these to change a text: a digit,
+# the "@" of an email, the separators of a field or of an IPv6 address, a comment,
+# the hexadecimal pairs of a MAC address without digit or the home directory of a user.
+_may_hold_pii_re = re.compile(
+    r"[\d@:=#]|[a-f]{2}-|[a-f]{4}\.|/(?:home|users)/|\\users\\", re.IGNORECASE
+)
+
+
+def _cannot_hold_pii(value: str) -> bool:
+    """Return True if anonymize_text_block() would return value unchanged, e.g: "latest"."""
+    return _may_hold_pii_re.search(value) is None
+
+
 def anonymize_field(value: str, name: str, value_template: Template) -> str:
+    if _cannot_hold_pii(value) and not is_password_field_name(name):
+        # Most of the values, no need to parse them
+        return value
     v = value.strip()
     if is_uuid_string(v):
         return value
@@ -135,26 +160,176 @@ def anonymize_field(value: str, name: str, value_template: Template) -> str:
     return anonymize_text_block(value, value_template=value_template)
 
 
-def anonymize_struct(o: Any, key_name: str = "", value_template: Optional[Template] = None) -> Any:
+class CircularReferenceError(ValueError):
+    """The structure passed to anonymize_struct() contains itself."""
+
+
+_default_value_template = Template("{{ $variable_name }}")
+
+# The results of anonymize_field(), by (value_template, field name, value). The field
+# name is only part of the key if it's a password field name, the other fields give the
+# same result for the same value.
+FieldMemo = dict[tuple[Template, str, str], str]
+
+
+def _shallow_copy(source: Union[dict[Any, Any], list[Any], tuple[Any, ...]]) -> Any:
+    """Return a dict or a list with the same items, tuples are copied as lists."""
+    return dict(source) if isinstance(source, dict) else list(source)
+
+
+def _store_copy(frame: list[Any], parent: list[Any]) -> None:
+    """Store the copy of a container in the copy of its parent, see _walk_struct()."""
+    copy, _, _, source, slot = frame
+    if copy is source:
+        # Changed in place
+        return
+    if copy is None:
+        if parent[0] is None:
+            # Nothing changed in the parent either, so far
+            return
+        copy = source
+    elif isinstance(source, tuple):
+        copy = tuple(copy)
+    if parent[0] is None:
+        parent[0] = _shallow_copy(parent[3])
+    parent[0][slot] = copy
+
+
+def _walk_struct(
+    o: Any,
+    key_name: str,
+    value_template: Optional[Template],
+    *,
+    share_unchanged: bool,
+    in_place: bool,
+    memo: Optional[FieldMemo],
+) -> tuple[Any, int]:
+    """
+    Anonymize the strings of a structure, return the result and the number of changed strings.
+
+    The structure is walked with an explicit stack, so its depth is not limited
+    by the recursion limit. By default, all the containers are copied. With
+    share_unchanged, a container is only copied if something changed in it. With
+    in_place, the dicts and the lists are changed in place, once even if they are
+    reachable from several parents, and the tuples are replaced in their parent
+    if something changed in them.
+
+    A string that comes back is only anonymized once, memo keeps the results and
+    the result strings are shared.
+    """
+    # pylint: disable=too-many-locals,too-many-branches,too-many-arguments,too-many-statements
     if not value_template:
-        value_template = Template("{{ $variable_name }}")
-
-    def key_name_str(k: Any) -> str:
-        return k if isinstance(k, str) else ""
-
+        value_template = _default_value_template
+    if memo is None:
+        memo = {}
     if key_name and not isinstance(key_name, str):
         key_name = str(key_name)
-
-    if isinstance(o, dict):
-        return {
-            k: anonymize_struct(v, key_name=key_name_str(k), value_template=value_template)
-            for k, v in o.items()
-        }
-    if isinstance(o, list):
-        return [anonymize_struct(v, key_name=key_name, value_template=value_template) for v in o]
-    if isinstance(o, str):
-        return anonymize_field(o, key_name, value_template)
-    return o
+    # The copies are created on the first change
+    lazy = share_unchanged or in_place
+    changes = 0
+    root = [o]
+    # The containers being walked: [copy, items left to walk, field name of the items or
+    # None to use the keys of a dict, source, slot in the parent]. The copy is None until
+    # an item changes in the lazy modes. Tuples are copied as lists and converted at the end.
+    stack: list[list[Any]] = [[root, enumerate(root), key_name, root, 0]]
+    # The ids of the sources in the stack
+    ancestors: set[int] = set()
+    # The ids of the dicts and the lists already rewritten in place, a container reachable
+    # from several parents, e.g: a YAML alias, is only anonymized once
+    rewritten: set[int] = set()
+    while stack:
+        frame = stack[-1]
+        copy, items, name, source, _ = frame
+        for slot, value in items:
+            if isinstance(value, str):
+                field_name = (slot if isinstance(slot, str) else "") if name is None else name
+                memo_key = (
+                    value_template,
+                    field_name if is_password_field_name(field_name) else "",
+                    value,
+                )
+                new_value = memo.get(memo_key)
+                if new_value is None:
+                    new_value = memo[memo_key] = anonymize_field(value, field_name, value_template)
+                if new_value != value:
+                    changes += 1
+                    if copy is None:
+                        copy = frame[0] = _shallow_copy(source)
+                    copy[slot] = new_value
+                elif not lazy:
+                    copy[slot] = value
+            elif isinstance(value, (dict, list, tuple)):
+                if id(value) in ancestors:
+                    raise CircularReferenceError
+                if id(value) in rewritten:
+                    continue
+                ancestors.add(id(value))
+                if in_place and not isinstance(value, tuple):
+                    rewritten.add(id(value))
+                if isinstance(value, dict):
+                    new_dict = value if in_place else None if lazy else {}
+                    stack.append([new_dict, iter(value.items()), None, value, slot])
+                else:
+                    field_name = (slot if isinstance(slot, str) else "") if name is None else name
+                    if in_place and isinstance(value, list):
+                        new_list = value
+                    else:
+                        new_list = None if lazy else [None] * len(value)
+                    stack.append([new_list, enumerate(value), field_name, value, slot])
+                break
+            elif not lazy:
+                copy[slot] = value
+        else:
+            stack.pop()
+            if not stack:
+                break
+            ancestors.discard(id(source))
+            _store_copy(frame, stack[-1])
+    return root[0], changes
+
+
+def anonymize_struct(
+    o: Any,
+    key_name: str = "",
+    value_template: Optional[Template] = None,
+    *,
+    share_unchanged: bool = False,
+    memo: Optional[FieldMemo] = None,
+) -> Any:
+    """
+    Return a copy of a structure of dicts, lists and tuples with the strings anonymized.
+
+    The strings of a dict use their key as field name, the ones of a list or a
+    tuple use the field name of the container. With share_unchanged, a container
+    is only copied if something changed in it, the result shares the unchanged
+    containers with o.
+
+    The same string is only anonymized once per call. Pass the same memo dict to
+    several calls to keep the results between them, it is never cleared.
+    """
+    return _walk_struct(
+        o, key_name, value_template, share_unchanged=share_unchanged, in_place=False, memo=memo
+    )[0]
+
+
+def anonymize_struct_in_place(
+    o: Union[dict[Any, Any], list[Any]],
+    key_name: str = "",
+    value_template: Optional[Template] = None,
+    *,
+    memo: Optional[FieldMemo] = None,
+) -> int:
+    """
+    Anonymize the strings of a structure in place, return the number of changed strings.
+
+    Like anonymize_struct(), without any copy of the dicts and the lists. A tuple
+    is immutable, it's replaced in its parent if something changed in it.
+    """
+    if not isinstance(o, (dict, list)):
+        raise TypeError(type(o))
+    return _walk_struct(
+        o, key_name, value_template, share_unchanged=False, in_place=True, memo=memo
+    )[1]
 
 
 def anonymize(o: Any, key_name: str = "") -> Any:
@@ -162,161 +337,397 @@ def anonymize(o: Any, key_name: str = "") -> Any:
     return anonymize_struct(o, key_name=key_name)
 
 
-def hide_emails(block: str) -> str:
-    flags = re.MULTILINE | re.DOTALL | re.IGNORECASE
-    email_re = r"\b\S+@[a-z\.]+[a-z]{2,}\b"
-    return re.sub(fr"(?P<email>{email_re})", gen_email_address, block, flags=flags)
+_ipv4_re = re.compile(r"(?:0|[1-9][0-9]{0,2})(?:\.(?:0|[1-9][0-9]{0,2})){3}")
+_ipv6_re = re.compile(r"(?:[0-9a-fA-F]{0,4}:){2,8}[0-9a-fA-F]{0,4}")
 
 
-def hide_ip_addresses(block: str) -> str:
-    flags = re.MULTILINE | re.DOTALL | re.IGNORECASE
+def _parse_ipv4(value: str) -> Optional[IPv4Address]:
+    """Return the IPv4 address, or None if value is not one, with the rules of ipaddress."""
+    if not _ipv4_re.fullmatch(value):
+        return None
+    octets = [int(octet) for octet in value.split(".")]
+    if max(octets) > 255:
+        return None
+    return IPv4Address(bytes(octets))
 
-    def _rewrite(m: re.Match[str]) -> str:
-        try:
-            ip = ipaddress.ip_address(m.group("ip_address"))
-        except ValueError:
-            return m.group("ip_address")
-        if ip.version == 4:
-            return str(redact_ipv4_address(ip))
-        return str(redact_ipv6_address(ip))
 
-    return re.sub(
-        r"(?P<ip_address>(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})|[a-f\d:]{3,32})",
-        _rewrite,
-        block,
-        flags=flags,
-    )
+def _parse_ipv6(value: str) -> Optional[IPv6Address]:
+    """
+    Return the IPv6 address, or None if value is not one, with the rules of ipaddress.
 
+    The IPv6 addresses that end with an IPv4 address are not supported.
+    """
+    if not _ipv6_re.fullmatch(value) or ":::" in value or value.count("::") > 1:
+        return None
+    head, skip, tail = value.partition("::")
+    high = head.split(":") if head else []
+    low = tail.split(":") if tail else []
+    # The "::" replaces at least one hextet, without it there are exactly 8 of them
+    zeros = 8 - len(high) - len(low)
+    # A single ":" at the beginning or the end gives an empty hextet
+    if (zeros < 1 if skip else zeros) or "" in high or "" in low:
+        return None
+    hextets = high + ["0"] * zeros + low
+    return IPv6Address(int("".join(h.rjust(4, "0") for h in hextets), 16))
 
-def hide_us_ssn(block: str) -> str:
-    flags = re.MULTILINE | re.DOTALL | re.IGNORECASE
 
-    def _rewrite(_: re.Match[str]) -> str:
-        return "{{ ssn }}"
+def _rewrite_ip_address(m: re.Match[str]) -> str:
+    value = m.group("ip_address")
+    # Most of the candidates are hexadecimal words, they are not even parsed
+    if ":" in value:
+        ipv6 = _parse_ipv6(value)
+        return str(redact_ipv6_address(ipv6)) if ipv6 else value
+    ipv4 = _parse_ipv4(value) if "." in value else None
+    return str(redact_ipv4_address(ipv4)) if ipv4 else value
 
-    us_ssn_regex = r"\b(?!666|000|9\d{2})\d{3}-(?!00)\d{2}-(?!0{4})\d{4}\b"
-    return re.sub(us_ssn_regex, _rewrite, block, flags=flags)
 
+def _rewrite_us_ssn(_: re.Match[str]) -> str:
+    return "{{ ssn }}"
 
-def hide_mac_addresses(block: str) -> str:
-    flags = re.MULTILINE | re.DOTALL | re.IGNORECASE
 
-    def _rewrite(m: re.Match[str]) -> str:
-        idx = crc32(m.group("mac").encode())
+def _rewrite_mac_address(m: re.Match[str]) -> str:
+    idx = crc32(m.group("mac").encode())
 
-        def gen() -> Generator[str, None, None]:
-            for c in m.group("mac"):
-                if c in ["-", ":", "."]:
-                    yield c
-                else:
-                    yield str(hex(int(c, 16) + idx % 0xF)[-1])
+    def gen() -> Generator[str, None, None]:
+        for c in m.group("mac"):
+            if c in ["-", ":", "."]:
+                yield c
+            else:
+                yield str(hex(int(c, 16) + idx % 0xF)[-1])
 
-        return "".join(c for c in gen())
+    return "".join(c for c in gen())
+
+
+def _rewrite_us_phone_number(_: re.Match[str]) -> str:
+    return "(311) 555-2368"
+
+
+# The sum of the digits of 2 * d, for each digit d
+_luhn_doubled = str.maketrans("0123456789", "0246813579")
+
+
+def _luhn_checksum_is_valid(number: str) -> bool:
+    if not number.isascii():
+        number = "".join(str(int(c)) for c in number)
+    doubled = number[-2::-2].translate(_luhn_doubled)
+    return (sum(map(int, number[-1::-2])) + sum(map(int, doubled))) % 10 == 0
+
+
+def _rewrite_credit_card(m: re.Match[str]) -> str:
+    cc = m.group("cc").replace(" ", "").replace("-", "")
+    return "{{ credit_card_number }}" if _luhn_checksum_is_valid(cc) else m.group("cc")
+
+
+known_users = {
+    "cloud-user",
+    "ec2-user",
+    "fedora",
+    "root",
+    "ubuntu",
+    "user",
+}
+
+
+def _rewrite_user_name(m: re.Match[str]) -> str:
+    if m.group("user_name") in known_users or is_jinja2_expression(m.group("user_name")):
+        return m.group("user_name")
+    return "ano-user"
+
+
+_flags = re.MULTILINE | re.DOTALL | re.IGNORECASE
+
+# The runs of non-space characters with an "@"
+_email_run_re = re.compile(r"(?<!\S)\S*@\S*")
+_email_domain_re = re.compile(r"[a-z.]*", re.IGNORECASE)
+_email_tld_re = re.compile(r"[a-z]{2,}", re.IGNORECASE)
+_word_boundary_re = re.compile(r"\b")
+_word_char_re = re.compile(r"\w")
+
+
+def _email_domain_end(block: str, at: int) -> Optional[int]:
+    r"""Return where [a-z.]+[a-z]{2,}\b matches after the "@" at position at, if it does."""
+    start = at + 1
+    domain = _email_domain_re.match(block, start)
+    assert domain  # for mypy # noqa: S101
+    end = domain.end()
+    domain_end = None
+    # The regex backtracks to the last run of 2 letters or more that is followed
+    # by a word boundary, there is always one before a dot
+    for tld in _email_tld_re.finditer(block, start, end):
+        if tld.end() < start + 3:
+            # [a-z.]+ needs at least one character
+            continue
+        if tld.end() < end or not _word_char_re.match(block, end):
+            domain_end = tld.end()
+    return domain_end
+
+
+class EmailDetector(RegexDetector):
+    r"""
+    Find the email addresses like \b\S+@[a-z.]+[a-z]{2,}\b, in linear time.
+
+    With the regex, \S+ is tried from every word boundary of a long run of
+    non-space characters and goes back over the whole run each time. Instead,
+    the domain of each "@" is checked once, and in a run the match always
+    starts on the first word boundary and ends after the last valid domain.
+    self.regex only builds the Match of this span.
+    """
+
+    def __init__(self) -> None:
+        super().__init__(
+            "email", r"(?P<email>.+)", gen_email_address, flags=re.DOTALL, triggers=["@"]
+        )
 
-    mac_regex = (
+    def finditer(self, block: str) -> Iterator[Match[str]]:
+        """Yield the same matches as the regex."""
+        for run in _email_run_re.finditer(block):
+            at = block.find("@", run.start(), run.end())
+            end = last_at = 0
+            while at != -1:
+                domain_end = _email_domain_end(block, at)
+                if domain_end:
+                    end, last_at = domain_end, at
+                at = block.find("@", at + 1, run.end())
+            if not end:
+                continue
+            boundary = _word_boundary_re.search(block, run.start(), last_at)
+            if boundary and boundary.start() < last_at:
+                m = self.regex.match(block, boundary.start(), end)
+                assert m  # for mypy # noqa: S101
+                yield m
+
+
+email_detector = EmailDetector()
+ip_address_detector = RegexDetector(
+    "ip_address",
+    r"(?P<ip_address>(\d{1,3}\.\d{1,3}\.\d{1,3}\.\d{1,3})|[a-f\d:]{3,32})",
+    _rewrite_ip_address,
+    flags=_flags,
+    # An IPv6 address may have no digit, e.g: "fe::"
+    triggers=["digit", ":"],
+)
+us_ssn_detector = RegexDetector(
+    "us_ssn",
+    r"\b(?!666|000|9\d{2})\d{3}-(?!00)\d{2}-(?!0{4})\d{4}\b",
+    _rewrite_us_ssn,
+    flags=_flags,
+    triggers=["digit"],
+)
+mac_address_detector = RegexDetector(
+    "mac_address",
+    (
         r"(?P<mac>\b([0-9a-f]{2}[:-])"
         + r"{5}([0-9a-f]{2})|"  # noqa: W503
         + r"([0-9a-f]{4}\."  # noqa: W503
         + r"[0-9a-f]{4}\."  # noqa: W503
         + r"[0-9a-f]{4})\b)"  # noqa: W503
-    )
-    return re.sub(mac_regex, _rewrite, block, flags=flags)
+    ),
+    _rewrite_mac_address,
+    flags=_flags,
+    # A MAC address may have no digit, e.g: "ab-cd-ef-ab-cd-ef"
+    triggers=["digit", ":", "-", "."],
+)
+# All the formats in a single pass, the lookarounds don't consume the characters
+# around the number, so two numbers separated by a single character both match
+us_phone_number_detector = RegexDetector(
+    "us_phone_number",
+    r"(?<![\d\.])(?:1?\d{10}|\d{3}[- ]\d{3}-\d{4}|\(\d{3}\) \d{3}-\d{4})(?![\d\.])",
+    _rewrite_us_phone_number,
+    flags=_flags,
+    triggers=["digit"],
+)
+# 13 to 16 digits, the spaces and the dashes between the first 13 digits are
+# free, after that a space ends the number. Each digit and each separator can
+# only be matched one way, unlike with lazy quantifiers, so a failed attempt
+# doesn't try the other combinations.
+credit_card_detector = RegexDetector(
+    "credit_card",
+    (
+        r"(?P<before>([^\d-]|^))"
+        + r"(?P<cc>(?:\d[ -]*){12}\d(?:-*\d){0,3}-*)"  # noqa: W503
+        + r"(?P<after>([^\d-]|$))"  # noqa: W503
+    ),
+    _rewrite_credit_card,
+    flags=_flags,
+    group="cc",
+    triggers=["digit"],
+)
 
 
-def hide_us_phone_numbers(block: str) -> str:
-    flags = re.MULTILINE | re.DOTALL | re.IGNORECASE
-
-    def _rewrite(m: re.Match[str]) -> str:
-        return m.group("before") + "(311) 555-2368" + m.group("after")
-
-    pattern_before = r"(?P<before>([^\d\.]|^))"
-    pattern_after = r"(?P<after>([^\d\.]|$))"
-    regexes = [
-        r"(?P<number>\d{10})",
-        r"(?P<number>1\d{10})",
-        r"(?P<number>\d{3}-\d{3}-\d{4})",
-        r"(?P<number>\d{3} \d{3}-\d{4})",
-        r"(?P<number>\(\d{3}\) \d{3}-\d{4})",
+class _NextOccurrence:
+    """Find the next occurrence of a substring, cheap when the start only moves forward."""
+
+    def __init__(self, block: str, sub: str) -> None:
+        self.block = block
+        self.sub = sub
+        # The last result is still valid for a start in [_start, _found]
+        self._start = len(block) + 1
+        self._found = -1
+
+    def find(self, start: int) -> int:
+        if start < self._start or start > self._found != -1:
+            self._start = start
+            self._found = self.block.find(self.sub, start)
+        return self._found
+
+
+_spaces_re = re.compile(r"\s*")
+
+
+class UserNameDetector(RegexDetector):
+    """
+    Find the user names in a home directory path, in linear time.
+
+    The name is made of up to 255 items, a character or a {{ ... }} Jinja2
+    expression on a single line. With a regex, each "{{" that is never closed
+    scans the rest of the line again. Here, the closing braces and the new lines
+    are looked up with cursors that only move forward. self.regex only builds
+    the Match of the span that was found.
+    """
+
+    max_items = 255
+
+    def __init__(self, prefix: str, name_chars: str) -> None:
+        super().__init__(
+            "user_name",
+            rf"(?P<before>{prefix})(?P<user_name>.*)",
+            _rewrite_user_name,
+            flags=re.IGNORECASE | re.DOTALL,
+            group="user_name",
+            triggers=["user_dir"],
+        )
+        self.prefix_re = re.compile(prefix, re.IGNORECASE)
+        self.name_chars_re = re.compile(rf"{name_chars}*", re.IGNORECASE)
+
+    def finditer(self, block: str) -> Iterator[Match[str]]:
+        r"""Yield the same matches as prefix followed by (name_chars|{{\s*.*?\s*}}){,255}."""
+        closings = _NextOccurrence(block, "}}")
+        new_lines = _NextOccurrence(block, "\n")
+        # The end of the last non-space character before a closing
+        text_ends: dict[int, int] = {}
+
+        def jinja2_end(begin: int) -> int:
+            """Return the end of the expression that starts at begin, or -1."""
+            closing = closings.find(begin + 2)
+            if closing == -1:
+                return -1
+            spaces = _spaces_re.match(block, begin + 2)
+            assert spaces  # for mypy # noqa: S101
+            content = spaces.end()
+            if closing not in text_ends:
+                text_end = closing
+                while text_end and block[text_end - 1].isspace():
+                    text_end -= 1
+                text_ends[closing] = text_end
+            new_line = new_lines.find(content)
+            if new_line != -1 and new_line < text_ends[closing]:
+                return -1
+            return closing + 2
+
+        pos = 0
+        while prefix := self.prefix_re.search(block, pos):
+            pos = prefix.end()
+            items = self.max_items
+            while items:
+                chars = self.name_chars_re.match(block, pos, pos + items)
+                assert chars  # for mypy # noqa: S101
+                items -= chars.end() - pos
+                pos = chars.end()
+                if not items or not block.startswith("{{", pos):
+                    break
+                end = jinja2_end(pos)
+                if end == -1:
+                    break
+                pos = end
+                items -= 1
+            m = self.regex.match(block, prefix.start(), pos)
+            assert m  # for mypy # noqa: S101
+            yield m
+
+
+user_name_detectors = [
+    UserNameDetector(r"[c-z]:\\users\\", r"\w"),
+    UserNameDetector(r"/(home|Users)/", r"[a-z0-9_-]"),
+]
+
+# The order matters, it gives the priority when two matches overlap
+text_scanner = Scanner(
+    [
+        email_detector,
+        ip_address_detector,
+        us_ssn_detector,
+        mac_address_detector,
+        us_phone_number_detector,
+        credit_card_detector,
+        *user_name_detectors,
     ]
+)
+
+
+def hide_emails(block: str) -> str:
+    return Scanner([email_detector]).sub(block)
 
-    for r in regexes:
-        full_regex = pattern_before + r + pattern_after
-        block = re.sub(full_regex, _rewrite, block, flags=flags)
-    return block
+
+def hide_ip_addresses(block: str) -> str:
+    return Scanner([ip_address_detector]).sub(block)
+
+
+def hide_us_ssn(block: str) -> str:
+    return Scanner([us_ssn_detector]).sub(block)
+
+
+def hide_mac_addresses(block: str) -> str:
+    return Scanner([mac_address_detector]).sub(block)
+
+
+def hide_us_phone_numbers(block: str) -> str:
+    return Scanner([us_phone_number_detector]).sub(block)
 
 
 def hide_credit_cards(block: str) -> str:
-    flags = re.MULTILINE | re.DOTALL | re.IGNORECASE
+    return Scanner([credit_card_detector]).sub(block)
 
-    def _rewrite(m: re.Match[str]) -> str:
-        def luhn(n: str) -> bool:
-            r = [int(ch) for ch in str(n)][::-1]
-            return (sum(r[0::2]) + sum(sum(divmod(d * 2, 10)) for d in r[1::2])) % 10 == 0
 
-        cc = m.group("cc").replace(" ", "").replace("-", "")
-        new_value = "{{ credit_card_number }}" if luhn(cc) else m.group("cc")
-        return m.group("before") + new_value + m.group("after")
+_quote_or_comment_re = re.compile(r"[\"'#]")
 
-    cc_regex = r"(?P<before>([^\d-]|^))(?P<cc>(?:\d[ -]*?){13,16})(?P<after>([^\d-]|$))"
 
-    return re.sub(cc_regex, _rewrite, block, flags=flags)
+def hide_comment_in_line(line: str) -> str:
+    # The quotes are a stack where two consecutive entries always differ, e.g: "'"
+    # so the depth and the last quote are enough to know its state.
+    depth = 0
+    last_quote = ""
+    for m in _quote_or_comment_re.finditer(line):
+        c = m.group(0)
+        if c == "#":
+            if not depth:
+                return line[: m.start()].rstrip(" ")
+        elif depth and c == last_quote:
+            depth -= 1
+            last_quote = "'" if c == '"' else '"'
+        else:
+            depth += 1
+            last_quote = c
+    return line
 
 
 def hide_comments(block: str) -> str:
-    new_block = ""
-    quotes = ""
-    in_comment = False
-    for c in block:
-        if c == "\n":
-            in_comment = False
-            quotes = ""
-            new_block += c
-        elif in_comment:
-            continue
-        elif c in ['"', "'"]:
-            if quotes and quotes[-1] == c:
-                quotes = quotes[:-1]
-            else:
-                quotes += c
-            new_block += c
-        elif c == "#" and not quotes:
-            in_comment = True
-            new_block = new_block.rstrip(" ")
-        else:
-            new_block += c
-    return new_block
+    if "#" not in block:
+        return block
+    lines = block.split("\n")
+    for idx, line in enumerate(lines):
+        if "#" in line:
+            lines[idx] = hide_comment_in_line(line)
+    return "\n".join(lines)
 
 
 def hide_user_name(block: str) -> str:
-    flags = re.IGNORECASE
-
-    known_users = {
-        "cloud-user",
-        "ec2-user",
-        "fedora",
-        "root",
-        "ubuntu",
-        "user",
-    }
-
-    def _rewrite(m: re.Match[str]) -> str:
-        user = (
-            m.group("user_name")
-            if (m.group("user_name") in known_users or is_jinja2_expression(m.group("user_name")))
-            else "ano-user"
-        )
-        return m.group("before") + user
-
-    user_regexes = [
-        r"(?P<before>[c-z]:\\users\\)(?P<user_name>(\w|{{\s*.*?\s*}}){,255})",
-        r"(?P<before>/(home|Users)/)(?P<user_name>([a-z0-9_-]|{{\s*.*?\s*}}){,255})",
-    ]
-    for regex in user_regexes:
-        block = re.sub(regex, _rewrite, block, flags=flags)
-    return block
+    return Scanner(user_name_detectors).sub(block)
 
 
 def hide_secrets(block: str, value_template: Template) -> str:
+    if ":" not in block and "=" not in block:
+        # No separator, so no field with a value
+        return block
     root_node = parse_raw_block(block)
 
     output = ""
@@ -340,14 +751,83 @@ def anonymize_text_block(block: str, value_template: Optional[Template] = None)
     if not value_template:
         value_template = Template("{{ $variable_name }}")
 
-    block = hide_comments(block)
-    block = hide_secrets(block, value_template)
-    block = hide_emails(block)
-    block = hide_ip_addresses(block)
-    block = hide_us_ssn(block)
-    block = hide_mac_addresses(block)
-    block = hide_us_phone_numbers(block)
-    block = hide_credit_cards(block)
-    block = hide_user_name(block)
-
-    return block
+    return anonymize_segment(hide_comments(block), value_template)
+
+
+def anonymize_segment(segment: str, value_template: Template) -> str:
+    """
+    Anonymize a segment of iter_segments(), its comments are already hidden.
+
+    Anonymizing the segments one by one gives the same result as anonymize_text_block().
+    """
+    segment = hide_secrets(segment, value_template)
+    return text_scanner.sub(segment)
+
+
+def iter_segments(lines: Iterable[str], max_lookahead: int) -> Generator[str, None, None]:
+    """
+    Group the lines without their comments in segments that can be anonymized separately.
+
+    A segment ends when no quoted string, multi-lines block or Jinja2 expression
+    is still opened, or when it reaches max_lookahead lines (0 for no limit).
+    Each segment goes through anonymize_segment(), the segments can be
+    grouped or dispatched to other workers, as long as they stay in order.
+    """
+    pending: list[str] = []
+    open_quotes: list[tuple[str, bool]] = []
+    # The previous line looks like "key: |"
+    after_header = False
+    # The indentation of the multi-lines block in progress
+    block_indent = 0
+    in_jinja = False
+    for line in lines:
+        if "#" in line:
+            if line.endswith("\n"):
+                line = hide_comment_in_line(line[:-1]) + "\n"
+            else:
+                line = hide_comment_in_line(line)
+        indent = len(line) - len(line.lstrip(" "))
+        in_block = (after_header and indent > 0) or (0 < block_indent <= indent)
+        if pending and (len(pending) == max_lookahead or not (in_block or open_quotes or in_jinja)):
+            yield "".join(pending)
+            pending = []
+            open_quotes = []
+            in_jinja = False
+        pending.append(line)
+
+        if in_block:
+            block_indent = block_indent or indent
+            after_header = False
+        else:
+            block_indent = 0
+            after_header = is_multi_lines_header(line)
+        if "'" in line or '"' in line:
+            update_open_quotes(line, open_quotes)
+        if "{{" in line or "}}" in line:
+            in_jinja = line.rfind("{{") > line.rfind("}}") or (in_jinja and "}}" not in line)
+    if pending:
+        yield "".join(pending)
+
+
+def anonymize_text_stream(
+    lines: Iterable[str], value_template: Optional[Template] = None, max_lookahead: int = 0
+) -> Generator[str, None, None]:
+    """
+    Anonymize a text line by line, the result is the same as with anonymize_text_block().
+
+    The lines must keep their line ending, like when iterating over a file.
+    A line is only returned once the anonymizer knows it won't depend on the
+    following lines, e.g: the end of a quoted string. max_lookahead caps the
+    number of lines held in memory, 0 (the default) for no limit. A bigger
+    segment is cut arbitrarily: the part of a secret after the cut is returned
+    in clear, the result is only the same as anonymize_text_block() without a cap.
+    """
+    if not value_template:
+        value_template = Template("{{ $variable_name }}")
+
+    for segment in iter_segments(lines, max_lookahead):
+        *new_lines, last = anonymize_segment(segment, value_template).split("\n")
+        for new_line in new_lines:
+            yield new_line + "\n"
+        if last:
+            yield last
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""Anonymize many items with a pool of processes."""
+import os
+from collections import deque
+from collections.abc import Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from itertools import islice
+from string import Template
+from types import TracebackType
+from typing import Any, Optional
+
+from ansible_anonymizer.anonymizer import anonymize_struct, anonymize_text_block
+
+
+def anonymize_item(item: Any, value_template: Optional[Template] = None) -> Any:
+    """Anonymize a text block, or a structure."""
+    if isinstance(item, str):
+        return anonymize_text_block(item, value_template=value_template)
+    return anonymize_struct(item, value_template=value_template)
+
+
+def _anonymize_batch(batch: list[Any], value_template: Optional[Template]) -> list[Any]:
+    return [anonymize_item(item, value_template) for item in batch]
+
+
+class AnonymizerPool:
+    """
+    A pool of processes that can be reused for several batches of items.
+
+    The items are sent to the workers by chunks of chunksize items, to limit
+    the number of round trips. At most two chunks per worker are in flight,
+    the input can be a long iterator.
+    """
+
+    def __init__(self, jobs: Optional[int] = None, chunksize: int = 64) -> None:
+        jobs = jobs or os.cpu_count() or 1
+        self.executor = ProcessPoolExecutor(max_workers=jobs)
+        self.max_in_flight = 2 * jobs
+        self.chunksize = max(1, chunksize)
+
+    def anonymize_many(
+        self, items: Iterable[Any], value_template: Optional[Template] = None
+    ) -> Iterator[Any]:
+        """Yield the anonymized items, in the order of the input."""
+        func = partial(_anonymize_batch, value_template=value_template)
+        iterator = iter(items)
+        in_flight: deque[Future[list[Any]]] = deque()
+        while True:
+            while len(in_flight) < self.max_in_flight:
+                batch = list(islice(iterator, self.chunksize))
+                if not batch:
+                    break
+                in_flight.append(self.executor.submit(func, batch))
+            if not in_flight:
+                return
+            yield from in_flight.popleft().result()
+
+    def close(self) -> None:
+        """Stop the workers."""
+        self.executor.shutdown()
+
+    def __enter__(self) -> "AnonymizerPool":
+        """Return the pool itself."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Stop the workers."""
+        self.close()
+
+
+def anonymize_many(
+    items: Iterable[Any],
+    jobs: Optional[int] = None,
+    chunksize: int = 64,
+    value_template: Optional[Template] = None,
+) -> list[Any]:
+    """
+    Anonymize a series of text blocks or structures with a pool of jobs processes.
+
+    The results keep the order of the input. Use AnonymizerPool to reuse the
+    workers between the calls.
+    """
+    with AnonymizerPool(jobs=jobs, chunksize=chunksize) as pool:
+        return list(pool.anonymize_many(items, value_template=value_template))
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""Keep the results of the anonymizer for the inputs that come back."""
+import pathlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from hashlib import blake2b
+from string import Template
+from types import TracebackType
+from typing import Any, NamedTuple, Optional, Union
+
+from ansible_anonymizer import __version__
+from ansible_anonymizer.anonymizer import anonymize_struct, anonymize_text_block
+
+# The tags of the types in the canonical form of a structure. No subclass, they
+# may change repr() or hold some other state
+_scalar_tags: dict[type, str] = {str: "s", int: "i", float: "f", bool: "b", type(None): "n"}
+_container_tags: dict[type, str] = {dict: "d", list: "l", tuple: "t"}
+_leave = object()
+
+
+class CacheInfo(NamedTuple):
+    """The statistics of a ResultCache."""
+
+    hits: int
+    misses: int
+    evictions: int
+    currsize: int
+    maxsize: int
+
+
+def make_key(*parts: str) -> bytes:
+    """Hash the parts of a key, the separator avoids ambiguous concatenations."""
+    h = blake2b(digest_size=16)
+    for part in parts:
+        encoded = part.encode("utf-8", "surrogatepass")
+        h.update(len(encoded).to_bytes(8, "little"))
+        h.update(encoded)
+    return h.digest()
+
+
+def _struct_key(o: Any) -> Optional[bytes]:
+    """
+    Hash the canonical form of a structure made of dict, list, tuple and scalars.
+
+    Return None if o holds another type, or if it contains itself:
+    anonymize_struct() raises CircularReferenceError for the latter.
+    """
+    # Each value is written as its tag, the length of its payload and the payload
+    parts: list[str] = []
+    # The ids of the containers in the path to the current value
+    path: list[int] = []
+    ancestors: set[int] = set()
+    # The values to walk, _leave follows the items of a container
+    stack: list[Any] = [o]
+    while stack:
+        current = stack.pop()
+        if current is _leave:
+            ancestors.discard(path.pop())
+            continue
+        kind = type(current)
+        tag = _scalar_tags.get(kind)
+        if tag:
+            payload = current if kind is str else repr(current)
+            parts.append(f"{tag}{len(payload)}:{payload}")
+            continue
+        tag = _container_tags.get(kind)
+        if not tag or id(current) in ancestors:
+            return None
+        parts.append(f"{tag}{len(current)}:")
+        path.append(id(current))
+        ancestors.add(id(current))
+        stack.append(_leave)
+        if kind is dict:
+            for key, value in reversed(current.items()):
+                stack.append(value)
+                stack.append(key)
+        else:
+            stack.extend(reversed(current))
+    return blake2b("".join(parts).encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+class ResultCache:
+    """
+    A bounded LRU cache in front of anonymize_text_block() and anonymize_struct().
+
+    The key is a hash of the input and of the value_template. A structure is
+    only cached if it's made of dict, list, tuple and scalars. The callers
+    that pass the same structure receive the same result object, they must
+    not modify it. The cache can be shared by several threads.
+    """
+
+    def __init__(self, maxsize: int = 1024) -> None:
+        self.maxsize = maxsize
+        self._entries: OrderedDict[bytes, Any] = OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def _get(self, key: bytes) -> tuple[bool, Any]:
+        with self._lock:
+            try:
+                value = self._entries[key]
+            except KeyError:
+                self._misses += 1
+                return False, None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return True, value
+
+    def _set(self, key: bytes, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def anonymize_text_block(self, block: str, value_template: Optional[Template] = None) -> str:
+        """Anonymize a text block, or return the result of a previous call."""
+        key = make_key("text", value_template.template if value_template else "", block)
+        found, result = self._get(key)
+        if not found:
+            result = anonymize_text_block(block, value_template=value_template)
+            self._set(key, result)
+        return str(result)
+
+    def anonymize_struct(
+        self, o: Any, key_name: str = "", value_template: Optional[Template] = None
+    ) -> Any:
+        """Anonymize a structure, or return the result of a previous call, it's not a copy."""
+        o_key = _struct_key(o)
+        if o_key is None:
+            return anonymize_struct(o, key_name=key_name, value_template=value_template)
+        key = make_key(
+            "struct", value_template.template if value_template else "", str(key_name), o_key.hex()
+        )
+        found, result = self._get(key)
+        if not found:
+            result = anonymize_struct(o, key_name=key_name, value_template=value_template)
+            self._set(key, result)
+        return result
+
+    def cache_info(self) -> CacheInfo:
+        """Return the hit/miss/eviction counters and the size of the cache."""
+        with self._lock:
+            return CacheInfo(
+                self._hits, self._misses, self._evictions, len(self._entries), self.maxsize
+            )
+
+    def cache_clear(self) -> None:
+        """Remove all the entries and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._hits = self._misses = self._evictions = 0
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key BLOB PRIMARY KEY,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS stats (
+    id INTEGER PRIMARY KEY CHECK (id = 0),
+    total_size INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO stats VALUES (0, 0);
+CREATE TRIGGER IF NOT EXISTS entries_insert AFTER INSERT ON entries BEGIN
+    UPDATE stats SET total_size = total_size + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_update AFTER UPDATE OF size ON entries BEGIN
+    UPDATE stats SET total_size = total_size - OLD.size + NEW.size;
+END;
+CREATE TRIGGER IF NOT EXISTS entries_delete AFTER DELETE ON entries BEGIN
+    UPDATE stats SET total_size = total_size - OLD.size;
+END;
+"""
+
+
+class DiskCache:
+    """
+    A persistent cache of anonymized strings, in a SQLite database.
+
+    Several processes can use the same directory at the same time, each one
+    with its own DiskCache. The keys include the version of the library, an
+    upgrade doesn't return stale results. Past max_size characters, the least
+    recently used entries are evicted, the last use of an entry is known to
+    refresh_interval seconds. cache_info() gives the counters of the current
+    process, and the sizes of the database in characters.
+    """
+
+    filename = "anonymizer-cache.sqlite3"
+    # Number of entries removed at once when the cache is full
+    eviction_batch = 64
+    # The last use of an entry is only updated once it is older than that, in
+    # seconds, so the hits rarely wait for the write lock
+    refresh_interval = 60.0
+
+    def __init__(
+        self, directory: Union[str, pathlib.Path], max_size: int = 256 * 1024 * 1024
+    ) -> None:
+        directory = pathlib.Path(directory).expanduser()
+        directory.mkdir(parents=True, exist_ok=True)
+        self.max_size = max_size
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        # Autocommit mode, the writes open their own IMMEDIATE transactions
+        self._connection = sqlite3.connect(
+            directory / self.filename, timeout=60, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    def key(self, *parts: str) -> bytes:
+        """Return the key of an entry."""
+        return make_key(__version__, *parts)
+
+    def get(self, key: bytes) -> Optional[str]:
+        """Return the value of an entry, or None."""
+        row = self._connection.execute(
+            "SELECT value, last_used FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            self._misses += 1
+            return None
+        self._hits += 1
+        now = time.time()
+        if now - row[1] > self.refresh_interval:
+            self._connection.execute("UPDATE entries SET last_used = ? WHERE key = ?", (now, key))
+        return str(row[0])
+
+    def set(self, key: bytes, value: str) -> None:
+        """Store an entry, and evict the oldest ones if the cache is too big."""
+        cursor = self._connection.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            cursor.execute(
+                "INSERT INTO entries (key, value, size, last_used) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (key) DO UPDATE SET "
+                "value = excluded.value, size = excluded.size, last_used = excluded.last_used",
+                (key, value, len(value), time.time()),
+            )
+            while cursor.execute("SELECT total_size FROM stats").fetchone()[0] > self.max_size:
+                cursor.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entries ORDER BY last_used LIMIT ?)",
+                    (self.eviction_batch,),
+                )
+                self._evictions += cursor.rowcount
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+
+    def anonymize_text_block(self, block: str, value_template: Optional[Template] = None) -> str:
+        """Anonymize a text block, or return the result of a previous call."""
+        key = self.key("text", value_template.template if value_template else "", block)
+        result = self.get(key)
+        if result is None:
+            result = anonymize_text_block(block, value_template=value_template)
+            self.set(key, result)
+        return result
+
+    def cache_info(self) -> CacheInfo:
+        """Return the hit/miss/eviction counters and the size of the cache."""
+        total_size = self._connection.execute("SELECT total_size FROM stats").fetchone()[0]
+        return CacheInfo(self._hits, self._misses, self._evictions, total_size, self.max_size)
+
+    def close(self) -> None:
+        """Close the database."""
+        self._connection.close()
+
+    def __enter__(self) -> "DiskCache":
+        """Return the cache itself."""
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        """Close the database."""
+        self.close()
@@ -2,23 +2,220 @@
 # pylint: disable=missing-module-docstring
 # pylint: disable=missing-function-docstring
 import argparse
+import contextlib
+import io
+import multiprocessing.util
+import os
 import pathlib
+import shutil
+import sys
+import tempfile
+import time
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Optional, TextIO
 
 import yaml
 
-from ansible_anonymizer.anonymizer import anonymize_struct, anonymize_text_block
+from ansible_anonymizer.anonymizer import anonymize_struct, anonymize_text_stream
+from ansible_anonymizer.cache import DiskCache
+
+# (source, destination or None to return the result, format, cache directory)
+Task = tuple[pathlib.Path, Optional[pathlib.Path], str, Optional[pathlib.Path]]
+# (source, size in bytes, anonymized content if there is no destination, error)
+Result = tuple[pathlib.Path, int, str, str]
+
+
+def open_input(file_path: pathlib.Path) -> contextlib.AbstractContextManager[TextIO]:
+    if str(file_path) == "-":
+        return contextlib.nullcontext(sys.stdin)
+    return file_path.open()
+
+
+# The DiskCache of the current process, by directory
+_disk_caches: dict[pathlib.Path, DiskCache] = {}
+
+
+def get_disk_cache(cache_dir: pathlib.Path) -> DiskCache:
+    if cache_dir not in _disk_caches:
+        _disk_caches[cache_dir] = DiskCache(cache_dir)
+    return _disk_caches[cache_dir]
+
+
+def close_disk_caches() -> None:
+    """Close the DiskCache of the current process."""
+    while _disk_caches:
+        _, cache = _disk_caches.popitem()
+        cache.close()
+
+
+def init_worker() -> None:
+    """Close the DiskCache of a worker process when it exits."""
+    # The workers exit without running the atexit handlers, only the finalizers
+    multiprocessing.util.Finalize(None, close_disk_caches, exitpriority=0)
+
+
+def anonymize_fd(
+    fd: TextIO, output: IO[str], file_format: str, cache: Optional[DiskCache] = None
+) -> None:
+    if cache:
+        content = fd.read()
+        key = cache.key("cli", file_format, content)
+        result = cache.get(key)
+        if result is None:
+            with io.StringIO(content) as uncached, io.StringIO() as buffer:
+                anonymize_fd(uncached, buffer, file_format)
+                result = buffer.getvalue()
+            cache.set(key, result)
+        output.write(result)
+    elif file_format == "text":
+        output.writelines(anonymize_text_stream(fd))
+    elif file_format == "yaml":
+        print(anonymize_struct(yaml.safe_load(fd)), file=output)
+
+
+def iter_files(path: pathlib.Path) -> Iterator[tuple[pathlib.Path, pathlib.Path]]:
+    """Yield the files of path with their relative path, the hidden ones are ignored."""
+    if not path.is_dir():
+        yield path, pathlib.Path(path.name)
+        return
+    for root, dirs, files in os.walk(path):
+        dirs[:] = sorted(d for d in dirs if not d.startswith("."))
+        for name in sorted(files):
+            if not name.startswith("."):
+                file_path = pathlib.Path(root) / name
+                yield file_path, file_path.relative_to(path)
+
+
+def anonymize_file(task: Task) -> Result:
+    source, destination, file_format, cache_dir = task
+    size = source.stat().st_size
+    cache = get_disk_cache(cache_dir) if cache_dir else None
+    try:
+        if not destination:
+            with source.open() as fd, io.StringIO() as buffer:
+                anonymize_fd(fd, buffer, file_format, cache)
+                return source, size, buffer.getvalue(), ""
+        destination.parent.mkdir(parents=True, exist_ok=True)
+        # Write a temporary file first, source and destination may be the same file
+        with source.open() as fd, tempfile.NamedTemporaryFile(
+            "w", dir=destination.parent, prefix=f".{destination.name}.", delete=False
+        ) as output:
+            temporary = pathlib.Path(output.name)
+            try:
+                anonymize_fd(fd, output, file_format, cache)
+            except BaseException:
+                temporary.unlink()
+                raise
+        shutil.copymode(source, temporary)
+        temporary.replace(destination)
+    except (UnicodeDecodeError, yaml.YAMLError) as e:
+        return source, size, "", f"{source}: skipped, {e}"
+    return source, size, "", ""
+
+
+def collect_tasks(args: argparse.Namespace) -> list[Task]:
+    tasks: list[Task] = []
+    for path in args.paths:
+        for file_path, relative_path in iter_files(path):
+            if args.in_place:
+                destination: Optional[pathlib.Path] = file_path
+            elif args.output_dir:
+                destination = args.output_dir / relative_path
+            else:
+                destination = None
+            tasks.append((file_path, destination, args.format, args.cache_dir))
+    return tasks
+
+
+def find_duplicate_destination(tasks: list[Task]) -> Optional[pathlib.Path]:
+    """Return a destination shared by several tasks, their writes would overwrite each other."""
+    destinations: set[pathlib.Path] = set()
+    for _, destination, _, _ in tasks:
+        if not destination:
+            continue
+        resolved = destination.resolve()
+        if resolved in destinations:
+            return destination
+        destinations.add(resolved)
+    return None
+
+
+def run_tasks(tasks: list[Task], jobs: int) -> tuple[int, int]:
+    """
+    Anonymize the files, the results come in order.
+
+    Return the number of files and their total size, the skipped files are not counted.
+    """
+    total_files = 0
+    total_size = 0
+    with contextlib.ExitStack() as stack:
+        if jobs > 1:
+            executor = stack.enter_context(
+                ProcessPoolExecutor(max_workers=jobs, initializer=init_worker)
+            )
+            chunksize = max(1, len(tasks) // (jobs * 4))
+            results: Iterator[Result] = executor.map(anonymize_file, tasks, chunksize=chunksize)
+        else:
+            stack.callback(close_disk_caches)
+            results = map(anonymize_file, tasks)
+        for _, size, content, error in results:
+            if error:
+                print(error, file=sys.stderr)
+                continue
+            total_files += 1
+            total_size += size
+            sys.stdout.write(content)
+    return total_files, total_size
 
 
 def main() -> None:
     parser = argparse.ArgumentParser()
-    parser.add_argument("file_path", type=pathlib.Path)
+    parser.add_argument(
+        "paths",
+        type=pathlib.Path,
+        nargs="*",
+        default=[pathlib.Path("-")],
+        help="the files or directories to anonymize, - or nothing to read stdin",
+    )
     parser.add_argument("--format", choices=["text", "yaml"], type=str, default="text")
+    parser.add_argument("--jobs", type=int, default=1, help="number of worker processes")
+    destination_group = parser.add_mutually_exclusive_group()
+    destination_group.add_argument(
+        "--output-dir", type=pathlib.Path, help="write the anonymized files in this directory"
+    )
+    destination_group.add_argument(
+        "--in-place", action="store_true", help="overwrite the files with the anonymized version"
+    )
+    parser.add_argument(
+        "--cache-dir",
+        type=pathlib.Path,
+        help="keep the results in a cache, the unchanged files are not anonymized again",
+    )
     args = parser.parse_args()
 
-    if args.format == "text":
-        print(anonymize_text_block(args.file_path.read_text()), end="")
-    elif args.format == "yaml":
-        print(anonymize_struct(yaml.safe_load(args.file_path.read_text())))
+    if [str(p) for p in args.paths] == ["-"]:
+        if args.output_dir or args.in_place:
+            parser.error("--output-dir and --in-place need some paths")
+        anonymize_fd(sys.stdin, sys.stdout, args.format)
+        return
+    if "-" in [str(p) for p in args.paths]:
+        parser.error("- cannot be mixed with other paths")
+
+    tasks = collect_tasks(args)
+    duplicate = find_duplicate_destination(tasks)
+    if duplicate:
+        parser.error(f"{duplicate}: several files would be written there")
+    start = time.perf_counter()
+    total_files, total_size = run_tasks(tasks, args.jobs)
+    duration = time.perf_counter() - start
+
+    if args.output_dir or args.in_place:
+        print(
+            f"{total_files} files, {total_size / 1e6:.1f}MB in {duration:.2f}s: "
+            f"{total_files / duration:.1f} files/s, {total_size / 1e6 / duration:.2f}MB/s",
+            file=sys.stderr,
+        )
 
 
 if __name__ == "__main__":
@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """Functions used to identify the field types."""
 import re
+from functools import lru_cache
 
 # Denylist regex to TC of secrets filter
 # From detect_secrets.plugins (Apache v2 License)
@@ -33,6 +34,7 @@ AFFIX_REGEX = r"\w*"
 DENYLIST_REGEX = r"|".join(DENYLIST)
 # Support for suffix after keyword i.e. password_secure = "value"
 DENYLIST_REGEX_WITH_PREFIX = fr"({DENYLIST_REGEX}){AFFIX_REGEX}"
+_denylist_re = re.compile(DENYLIST_REGEX_WITH_PREFIX, flags=re.MULTILINE | re.IGNORECASE)
 
 
 def is_allowed_password_field(field_name: str) -> bool:
@@ -43,12 +45,14 @@ def is_allowed_password_field(field_name: str) -> bool:
     return False
 
 
+# The same field names come back again and again, is_password_field_name.cache_info()
+# gives the hit/miss stats
+@lru_cache(maxsize=4096)
 def is_password_field_name(name: str) -> bool:
     """Return True if name looks like a password field name."""
-    flags = re.MULTILINE | re.IGNORECASE
     if is_allowed_password_field(name):
         return False
-    return re.search(DENYLIST_REGEX_WITH_PREFIX, name, flags=flags) is not None
+    return _denylist_re.search(name) is not None
 
 
 def is_jinja2_expression(value: str) -> bool:
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""A sorted index of IP networks, to test the addresses in O(log n)."""
+from bisect import bisect_left, bisect_right
+from collections.abc import Iterable
+from ipaddress import IPv4Network, IPv6Network
+from typing import Union
+
+Network = Union[IPv4Network, IPv6Network]
+
+
+class NetworkIndex:
+    """
+    A set of networks of the same IP version, stored as sorted intervals of integers.
+
+    The overlapping and adjacent networks are merged, so the cost of a lookup
+    only grows with the logarithm of the number of intervals.
+    """
+
+    def __init__(self, version: int, networks: Iterable[Network] = ()) -> None:
+        self.version = version
+        # Two sorted lists of the same length, the intervals are disjoint
+        self._starts: list[int] = []
+        self._ends: list[int] = []
+        for network in networks:
+            self.add(network)
+
+    def add(self, network: Network) -> None:
+        """Add a network to the index."""
+        if network.version != self.version:
+            raise TypeError(network)
+        start = int(network.network_address)
+        end = int(network.broadcast_address)
+        # The first interval that may overlap or touch the new one
+        first = bisect_left(self._ends, start - 1)
+        last = first
+        while last < len(self._starts) and self._starts[last] <= end + 1:
+            start = min(start, self._starts[last])
+            end = max(end, self._ends[last])
+            last += 1
+        del self._starts[first:last]
+        del self._ends[first:last]
+        self._starts.insert(first, start)
+        self._ends.insert(first, end)
+
+    def __contains__(self, address: object) -> bool:
+        """Return True if the address, as an integer, is in one of the networks."""
+        if not isinstance(address, int):
+            return False
+        i = bisect_right(self._starts, address) - 1
+        return i >= 0 and address <= self._ends[i]
+
+    def __len__(self) -> int:
+        """Return the number of intervals, after the merge of the networks."""
+        return len(self._starts)
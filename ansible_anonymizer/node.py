@@ -33,37 +33,55 @@ class NodeType(Enum):
 
 class Node:
     # pylint: disable=too-many-instance-attributes
-    """A element returned by the parser."""
-
-    def __init__(self, begin_at: int) -> None:
-        self.previous: Optional["Node"] = None
-        self.next: Optional["Node"] = None
+    """
+    A element returned by the parser.
+
+    A Node doesn't copy its text, it only keeps its position in the source block.
+    """
+
+    __slots__ = (
+        "source",
+        "begin_at",
+        "end_at",
+        "type",
+        "previous",
+        "next",
+        "holder",
+        "secret_value_of",
+        "closed_by",
+        "is_protected",
+    )
+
+    def __init__(self, begin_at: int, source: str = "") -> None:
+        self.source: str = source
         self.begin_at: int = begin_at
-        self.end_at: int
-        self.text: str = ""
+        self.end_at: int = begin_at
         self.type: NodeType = NodeType.unknown
+        self.previous: Optional["Node"] = None
+        self.next: Optional["Node"] = None
         self.holder: Optional["Node"] = None
         # Node of the field that point on this secret
         self.secret_value_of: Optional["Node"] = None
 
         # NOTE: Fields only used with quoted strings (called `holder`)
         self.closed_by: Optional["Node"] = None
-        self.sub: list["Node"] = []
         self.is_protected: bool = False
 
-    def attach(self, previous: "Node") -> None:
-        """Attach a new Node to the previous one in the series."""
+    @property
+    def text(self) -> str:
+        """Return the text of the Node."""
+        return self.source[self.begin_at : self.end_at]
+
+    def attach(self, previous: "Node", holder: Optional["Node"]) -> None:
+        """
+        Attach a new Node to the previous one in the series.
+
+        holder is the last quoted string holder that is still opened, the
+        parser keeps track of them.
+        """
         self.previous = previous
         previous.next = self
-        holder = previous
-        while holder:
-            if holder.type is NodeType.quoted_string_holder and not holder.closed_by:
-                holder.sub.append(self)
-                self.holder = holder
-                break
-            if not holder.previous:
-                break
-            holder = holder.previous
+        self.holder = holder
 
     def get_secret(self) -> Union["Node", None]:
         """Identify the secret Node associated with the current Node."""
@@ -96,9 +114,8 @@ class Node:
         """Merge the current node with the next one."""
         self.type = NodeType.unknown
         assert self.next  # for mypy # noqa: S101
-        self.text += self.next.text
+        self.end_at = self.next.end_at
         self.next.type = NodeType.deleted
-        self.next.text = "KILLED"
         self.next = self.next.next
         if self.next:
             self.next.previous = self
@@ -1,47 +1,62 @@
 #!/usr/bin/env python3
 """Parser for YAML-like structure that is error tolerant."""
+import re
 from collections.abc import Generator
 from typing import Optional, Union
 
 from .node import Node, NodeType
 from .parser_multi_lines import group_multi_lines
 
+# A run of characters that can be part of an Ansible variable name, or any
+# other character
+_token_re = re.compile(r"([A-Za-z0-9_-]+)|[^A-Za-z0-9_-]")
 
-def is_valid_first_character_for_a_variable(char: str) -> bool:
-    """Assuming variable names cannot start with a digit."""
-    return char.isascii() and (char.isalpha() or char in ["-", "_"])
+# The type of the Node of the characters that are not part of a field
+_char_types = {
+    "\\": NodeType.backslash,
+    ":": NodeType.separator,
+    "=": NodeType.separator,
+    "\n": NodeType.new_line,
+    " ": NodeType.space,
+}
 
 
-def is_valid_variable_character(char: str) -> bool:
-    """Return True if the character can be part of an Ansible variable name."""
-    # note: isnumeric accepts a wider range than just the 0-9
-    return char.isascii() and (char.isalpha() or char.isnumeric() or char in ["-", "_"])
+def close_holder(open_holders: list[Node], holder: Node) -> None:
+    """Remove a holder from the stack of the opened quoted strings."""
+    # Usually the last one, but a quote can also close an outer quoted string
+    for idx in range(len(open_holders) - 1, -1, -1):
+        if open_holders[idx] is holder:
+            del open_holders[idx]
+            return
 
 
-def is_field_value_sep(char: str) -> bool:
-    """Return True if the character is : or =."""
-    return char in [":", "="]
-
-
-def breakup_elements(block: str) -> Node:
+def _tokenize(block: str, resolve_quotes: bool) -> tuple[Node, list[Node]]:
     # pylint: disable=too-many-branches
-    # pylint: disable=too-many-statements
-    """Digest a text block an return a list of Nodes that will be simplified later."""
-    root_node = Node(0)
+    """
+    Digest a text block an return a list of Nodes and the protected quotes.
+
+    With resolve_quotes, the quotes that are never closed and the backslashes
+    that don't protect a quote are converted to regular leaves. The protected
+    quotes are returned for _merge_protected_quotes().
+    """
+    root_node = Node(0, block)
     root_node.type = NodeType.quoted_string_holder
     current_node = root_node
-    for pos, c in enumerate(block):  # pylint: disable=invalid-name
-        previous_node = current_node
-        current_node = Node(-1)  # -1 == undef, the variable will be reset
-        if c == "\\":
-            new_node = Node(pos)
-            new_node.attach(previous=previous_node)
-            new_node.type = NodeType.backslash
-            current_node = new_node
-        elif c in ["'", '"']:
-            is_protected = previous_node.type is NodeType.backslash
+    # The quoted string holders that are not closed yet
+    open_holders: list[Node] = [root_node]
+    protected_quotes: list[Node] = []
+    for m in _token_re.finditer(block):
+        new_node = Node(m.start(), block)
+        new_node.end_at = m.end()
+        c = m.group()  # pylint: disable=invalid-name
+        if resolve_quotes and current_node.type is NodeType.backslash and c not in ("'", '"'):
+            current_node.type = NodeType.unknown
+        if m.lastindex:
+            new_node.type = NodeType.field
+        elif c in ("'", '"'):
+            is_protected = current_node.type is NodeType.backslash
 
-            holder: Optional[Node] = previous_node
+            holder: Optional[Node] = current_node
             while holder:
                 if (
                     holder.text == c
@@ -52,173 +67,152 @@ def breakup_elements(block: str) -> Node:
                 holder = holder.holder
 
             if holder:
-                new_node = Node(pos)
-                new_node.attach(previous=previous_node)
                 new_node.type = NodeType.quoted_string_closing
+                new_node.attach(previous=current_node, holder=open_holders[-1])
                 holder.closed_by = new_node
-                current_node = new_node
+                close_holder(open_holders, holder)
             else:
-                new_node = Node(pos)
                 new_node.type = NodeType.quoted_string_holder
                 new_node.is_protected = is_protected
-                new_node.attach(previous=previous_node)
-                current_node = new_node
-        elif is_valid_first_character_for_a_variable(c):
-            if previous_node.type is NodeType.field:
-                current_node = previous_node
-            else:
-                new_node = Node(pos)
-                new_node.attach(previous=previous_node)
-                new_node.type = NodeType.field
-                current_node = new_node
-        elif is_valid_variable_character(c):
-            if previous_node.type is NodeType.field:
-                current_node = previous_node
-            else:
-                new_node = Node(pos)
-                new_node.attach(previous=previous_node)
-                new_node.type = NodeType.field
-                current_node = new_node
-        elif is_field_value_sep(c):
-            new_node = Node(pos)
-            new_node.attach(previous=previous_node)
-            new_node.type = NodeType.separator
-            current_node = new_node
-        elif c == "\n":
-            new_node = Node(pos)
-            new_node.attach(previous=previous_node)
-            new_node.type = NodeType.new_line
-            current_node = new_node
-        elif c == " ":
-            new_node = Node(pos)
-            new_node.attach(previous=previous_node)
-            new_node.type = NodeType.space
-            current_node = new_node
-        elif previous_node.type is not NodeType.unknown:
-            new_node = Node(pos)
-            new_node.attach(previous=previous_node)
+                new_node.attach(previous=current_node, holder=open_holders[-1])
+                open_holders.append(new_node)
+            if is_protected and resolve_quotes:
+                protected_quotes.append(new_node)
             current_node = new_node
+            continue
         else:
-            # Should never happend
-            new_node = Node(pos)
-            new_node.attach(previous=previous_node)
-            current_node = new_node
-
-        current_node.text += c
-    return root_node
+            new_node.type = _char_types.get(c, NodeType.unknown)
+        new_node.attach(previous=current_node, holder=open_holders[-1])
+        current_node = new_node
+    if resolve_quotes:
+        if current_node.type is NodeType.backslash:
+            current_node.type = NodeType.unknown
+        for holder in open_holders[1:]:
+            holder.type = NodeType.unknown
+    return root_node, protected_quotes
 
 
-def parse_raw_block(block: str) -> Node:
-    """Return block without any potential secrets."""
-    root_node = breakup_elements(block)
-    close_quotes(root_node)
-    group_multi_lines(root_node)
-    handle_backslashes(root_node)
-    combinate_value_fields(root_node)
-    identify_secrets(root_node)
-    return root_node
+def _merge_protected_quotes(protected_quotes: list[Node]) -> None:
+    """Merge each backslash with the quote it protects, it's the beginning of the quote."""
+    for quote in protected_quotes:
+        backslash = quote.previous
+        if not backslash or backslash.type is not NodeType.backslash:
+            # The backslash is already merged in a multi-lines block
+            continue
+        if quote.type in [NodeType.quoted_string_holder, NodeType.quoted_string_closing]:
+            quote.begin_at = backslash.begin_at
+            if backslash.previous:
+                backslash.previous.next = quote
+                quote.previous = backslash.previous
+            backslash.type = NodeType.deleted
+        else:
+            backslash.type = NodeType.unknown
 
 
-def close_quotes(root_node: Node) -> None:
-    """Close the quotes that are still opened."""
-    current_node = root_node.next
-    while current_node:
-        if current_node.type is NodeType.quoted_string_holder and not current_node.closed_by:
-            current_node.type = NodeType.unknown
-        current_node = current_node.next
+_quote_re = re.compile(r"[\"']")
 
 
-def handle_backslashes(root_node: Node) -> None:
+def update_open_quotes(line: str, open_quotes: list[tuple[str, bool]]) -> None:
     """
-    Convert the backslashes are regular unkown leaves.
+    Update the quoted strings still opened after a new line, like breakup_elements().
 
-    The backslash type is only used to identify the protected quotes.
+    open_quotes holds the (quote, is_protected) of the opened quoted strings.
+    The line must be complete: at the beginning of a line, the quotes still
+    opened are the only state that matters.
     """
-    current_node = root_node.next
-    while current_node:
-        if current_node.type is not NodeType.backslash:
-            pass
-        elif (
-            current_node.next
-            and current_node.next.type
-            in [NodeType.quoted_string_holder, NodeType.quoted_string_closing]
-            and current_node.holder is current_node.next.holder
-        ):
-            current_node.next.text = current_node.text + current_node.next.text
-            if current_node.previous:
-                current_node.previous.next = current_node.next
-                current_node.next.previous = current_node.previous
-            current_node.text = "KILLED"
-            current_node.type = NodeType.deleted
-            current_node = current_node.next
+    # Position of the previous quote if it's a closing one, a closing quote
+    # can itself be closed by the same quote
+    closing_at = -2
+    for m in _quote_re.finditer(line):
+        pos = m.start()
+        c = m.group()  # pylint: disable=invalid-name
+        is_protected = pos > 0 and line[pos - 1] == "\\"
+        if closing_at == pos - 1 and line[closing_at] == c:
+            closing_at = pos
+            continue
+        for idx in range(len(open_quotes) - 1, -1, -1):
+            if open_quotes[idx] == (c, is_protected):
+                del open_quotes[idx]
+                closing_at = pos
+                break
         else:
-            current_node.type = NodeType.unknown
-        current_node = current_node.next
+            open_quotes.append((c, is_protected))
+            closing_at = -2
 
 
-def combinate_value_fields(root_node: Node) -> None:
-    """Combinate the unquoted value strings."""
-    mergable_types = [NodeType.space, NodeType.field, NodeType.unknown, NodeType.space]
+def breakup_elements(block: str) -> Node:
+    """Digest a text block an return a list of Nodes that will be simplified later."""
+    root_node, _ = _tokenize(block, resolve_quotes=False)
+    return root_node
 
-    def _is_a_new_key_value(node: Node) -> bool:
-        """Check if the current node is actually the beginning of a new secret key/value."""
-        if not node.next:
-            return False
 
-        current = node.next
-        if current.type is not NodeType.space:
-            return False
+def parse_raw_block(block: str) -> Node:
+    """Return block without any potential secrets."""
+    root_node, protected_quotes = _tokenize(block, resolve_quotes=True)
+    group_multi_lines(root_node)
+    _merge_protected_quotes(protected_quotes)
+    _combinate_and_identify_secrets(root_node)
+    return root_node
 
-        while current.type == NodeType.space:
-            if current.next is None:
-                return False
-            current = current.next
 
-        # if we've got a separator after the field, we prefer to preserve
-        # it. e.g: secret1: foo secret2: bar, secret1 and secret2 are two distinct seecrets.
-        if current and current.type is NodeType.field and current.next and current.next.text == ":":
-            return True
+def _is_a_new_key_value(node: Node) -> bool:
+    """Check if the current node is actually the beginning of a new secret key/value."""
+    if not node.next:
         return False
 
-    def _find_separator_node(node: Node) -> Union[None, Node]:
-        while node and node.next:
-            if node.next.type is NodeType.space:
-                node = node.next
-            elif node.next and node.next.type is NodeType.separator:
-                return node.next
-            else:
-                return None
-        return None
+    current = node.next
+    if current.type is not NodeType.space:
+        return False
 
-    current_node = root_node
-    while current_node and current_node.next:
-        current_node = current_node.next
-        if current_node.type is not NodeType.field:
-            continue
-        if not current_node.is_password_field_name():
-            continue
+    while current.type == NodeType.space:
+        if current.next is None:
+            return False
+        current = current.next
 
-        secret_content_ptr = current_node.get_secret()
-        if not secret_content_ptr:
-            continue
-        separator = _find_separator_node(current_node)
-        if not separator:
-            continue
-        if secret_content_ptr.type is NodeType.quoted_string_holder:
-            current_node = secret_content_ptr.closed_by
-            continue
-        while (
-            secret_content_ptr.next
-            and (
-                (secret_content_ptr.next.type in mergable_types)
-                or (
-                    secret_content_ptr.next.type is NodeType.separator
-                    and secret_content_ptr.next.text != separator.text
-                )
+    # if we've got a separator after the field, we prefer to preserve
+    # it. e.g: secret1: foo secret2: bar, secret1 and secret2 are two distinct seecrets.
+    if current and current.type is NodeType.field and current.next and current.next.text == ":":
+        return True
+    return False
+
+
+def _find_separator_node(node: Node) -> Union[None, Node]:
+    while node and node.next:
+        if node.next.type is NodeType.space:
+            node = node.next
+        elif node.next and node.next.type is NodeType.separator:
+            return node.next
+        else:
+            return None
+    return None
+
+
+def _combinate_value(node: Node, secret_content_ptr: Node) -> Optional[Node]:
+    """
+    Combinate the unquoted value of a password field.
+
+    Return the end of the value when it's a quoted string, the caller jumps over it.
+    """
+    mergable_types = [NodeType.space, NodeType.field, NodeType.unknown, NodeType.space]
+
+    separator = _find_separator_node(node)
+    if not separator:
+        return None
+    if secret_content_ptr.type is NodeType.quoted_string_holder:
+        return secret_content_ptr.closed_by
+    while (
+        secret_content_ptr.next
+        and (
+            (secret_content_ptr.next.type in mergable_types)
+            or (
+                secret_content_ptr.next.type is NodeType.separator
+                and secret_content_ptr.next.text != separator.text
             )
-            and not _is_a_new_key_value(secret_content_ptr)
-        ):
-            secret_content_ptr.merge_with_next()
+        )
+        and not _is_a_new_key_value(secret_content_ptr)
+    ):
+        secret_content_ptr.merge_with_next()
+    return None
 
 
 def flatten(node: Node) -> Generator[Node, None, None]:
@@ -231,37 +225,53 @@ def flatten(node: Node) -> Generator[Node, None, None]:
         current = current.next
 
 
-def identify_secrets(root_node: Node) -> None:
-    """Remove the secret fields from a series of nodes."""
-
-    def identify_quoted_string(node: Node, secret_node: Node) -> None:
-        assert secret_node.closed_by  # for mypy # noqa: S101
-        cursor = secret_node.next
-        while cursor and cursor != secret_node.closed_by and cursor.next != secret_node.closed_by:
-            cursor.merge_with_next()
-        if secret_node.next and secret_node.next != secret_node.closed_by:
-            secret_node.next.secret_value_of = node
-            secret_node.next.type = NodeType.secret
-        if secret_node.next:
-            identify_secrets(secret_node.next)
-
-    def identify_regular_field(node: Node, secret_node: Node) -> None:
-        assert secret_node.holder  # for mypy # noqa: S101
-        secret_node.secret_value_of = node
-        secret_node.type = NodeType.secret
-        if secret_node.next:
-            identify_secrets(secret_node.next)
-
-    for node in flatten(root_node):
-        if node.type is not NodeType.field:
-            continue
-        if not node.is_password_field_name():
-            continue
+def _identify_quoted_string(node: Node, secret_node: Node) -> None:
+    assert secret_node.closed_by  # for mypy # noqa: S101
+    cursor = secret_node.next
+    while cursor and cursor != secret_node.closed_by and cursor.next != secret_node.closed_by:
+        cursor.merge_with_next()
+    if secret_node.next and secret_node.next != secret_node.closed_by:
+        secret_node.next.secret_value_of = node
+        secret_node.next.type = NodeType.secret
 
-        secret_node = node.get_secret()
-        if not secret_node:
-            continue
 
-        if secret_node.type is NodeType.quoted_string_holder:
-            return identify_quoted_string(node, secret_node)
-        return identify_regular_field(node, secret_node)
+def _identify_regular_field(node: Node, secret_node: Node) -> None:
+    assert secret_node.holder  # for mypy # noqa: S101
+    secret_node.secret_value_of = node
+    secret_node.type = NodeType.secret
+
+
+def _combinate_and_identify_secrets(root_node: Node) -> None:
+    """
+    Combinate the unquoted values of the password fields and identify the secrets.
+
+    It's a single sweep. The quoted secrets are identified right away. An unquoted secret waits
+    until the sweep reaches it, its own value may need to be combinated first.
+    """
+    # The end of a quoted value, the combination resumes after it
+    skip_until: Optional[Node] = None
+    # The field of an unquoted secret, and the secret
+    pending_field: Optional[Node] = None
+    pending_secret: Optional[Node] = None
+    current_node = root_node.next
+    while current_node:
+        node = current_node
+        current_node = node.next
+        if node is skip_until:
+            skip_until = None
+
+        secret_node: Optional[Node] = None
+        if node.type is NodeType.field and node.is_password_field_name():
+            secret_node = node.get_secret()
+            if secret_node and not skip_until:
+                skip_until = _combinate_value(node, secret_node)
+
+        if pending_field and node is pending_secret:
+            _identify_regular_field(pending_field, node)
+            pending_field = pending_secret = None
+        elif not secret_node:
+            pass
+        elif secret_node.type is NodeType.quoted_string_holder:
+            _identify_quoted_string(node, secret_node)
+        else:
+            pending_field, pending_secret = node, secret_node
@@ -3,6 +3,8 @@
 # pylint: disable=missing-function-docstring
 # pylint: disable=invalid-name
 """Identify and merge the multilines nodes."""
+import re
+
 from .node import Node, NodeType
 
 
@@ -35,6 +37,14 @@ def is_beginning_of_multiline_block(node: Node) -> bool:
     return True
 
 
+_multi_lines_header_re = re.compile(r"[A-Za-z0-9_-]: [|>]\n\Z")
+
+
+def is_multi_lines_header(line: str) -> bool:
+    """Return True if a line ends like is_beginning_of_multiline_block() expects."""
+    return _multi_lines_header_re.search(line) is not None
+
+
 def read_one_line(node: Node) -> Line:
     space_indent_length: int = 0
     nodes: list[Node] = []
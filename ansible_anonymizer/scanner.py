@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+"""Apply a series of detectors on a text block, like a series of re.sub() calls."""
+import re
+from abc import ABC, abstractmethod
+from collections.abc import Callable, Iterable, Iterator, Sequence
+from re import Match
+from typing import Union
+
+# (begin, end, new_text) of a span of the block
+Replacement = tuple[int, int, str]
+
+# The triggers that are a single character
+_trigger_chars = ("@", ":", "=", "#", "-", ".")
+# The other ones, "digit" uses the same definition as \d in the detectors
+_trigger_res = {
+    "digit": re.compile(r"\d"),
+    "user_dir": re.compile(r"/(?:home|users)/|\\users\\", re.IGNORECASE),
+}
+TRIGGERS = frozenset(_trigger_chars) | frozenset(_trigger_res)
+
+
+class UnknownTriggerError(ValueError):
+    """A detector uses a trigger that scan_triggers() doesn't know."""
+
+
+def scan_triggers(block: str) -> frozenset[str]:
+    """Return the triggers found in the block, each check stops at the first occurrence."""
+    found = [c for c in _trigger_chars if c in block]
+    found += [name for name, regex in _trigger_res.items() if regex.search(block)]
+    return frozenset(found)
+
+
+class Detector(ABC):
+    """
+    Base class of the detectors used by the Scanner.
+
+    A detector can only match a block that contains at least one of its
+    triggers, the Scanner skips it otherwise. Without triggers, it always runs.
+    """
+
+    def __init__(self, name: str, triggers: Iterable[str] = ()) -> None:
+        self.name = name
+        self.triggers = frozenset(triggers)
+        if not self.triggers <= TRIGGERS:
+            raise UnknownTriggerError(sorted(self.triggers - TRIGGERS))
+
+    def may_match(self, triggers: frozenset[str]) -> bool:
+        """Return False if the block can't hold a match, triggers comes from scan_triggers()."""
+        return not self.triggers or not self.triggers.isdisjoint(triggers)
+
+    @abstractmethod
+    def finditer(self, block: str) -> Iterator[Match[str]]:
+        """Yield the matches, the span of a match covers all the text it depends on."""
+
+    @abstractmethod
+    def replacement(self, m: Match[str]) -> Replacement:
+        """Return the replacement of a match, the new text may be unchanged."""
+
+
+class RegexDetector(Detector):
+    """A detector based on a regex and a rewrite function, like re.sub()."""
+
+    def __init__(
+        self,
+        name: str,
+        regex: str,
+        rewrite: Callable[[Match[str]], str],
+        flags: int = 0,
+        group: Union[int, str] = 0,
+        *,
+        triggers: Iterable[str] = (),
+    ) -> None:
+        # pylint: disable=too-many-arguments
+        super().__init__(name, triggers)
+        self.regex = re.compile(regex, flags)
+        self.rewrite = rewrite
+        # The part of the match that rewrite() returns, the rest is just context
+        self.group = group
+
+    def finditer(self, block: str) -> Iterator[Match[str]]:
+        """Yield the matches of the regex."""
+        return self.regex.finditer(block)
+
+    def replacement(self, m: Match[str]) -> Replacement:
+        """Call rewrite() on the match."""
+        begin, end = m.span(self.group)
+        return begin, end, self.rewrite(m)
+
+
+def apply_replacements(block: str, replacements: list[Replacement]) -> str:
+    """Return the block with all the replacements applied."""
+    if not replacements:
+        return block
+    chunks: list[str] = []
+    cursor = 0
+    for begin, end, new_text in replacements:
+        chunks.append(block[cursor:begin])
+        chunks.append(new_text)
+        cursor = end
+    chunks.append(block[cursor:])
+    return "".join(chunks)
+
+
+class Scanner:
+    """
+    Run a series of detectors, with the same result as a series of re.sub() calls.
+
+    Each detector sees the block as rewritten by the previous ones, the order of
+    the detectors gives the priority. The block is only rebuilt when a detector
+    changes something, and the detectors without any of their triggers in the
+    block are skipped.
+    """
+
+    def __init__(self, detectors: Sequence[Detector]) -> None:
+        self.detectors = list(detectors)
+
+    def sub(self, block: str) -> str:
+        """Return the block with the replacements of all the detectors applied."""
+        triggers = scan_triggers(block)
+        for detector in self.detectors:
+            if not detector.may_match(triggers):
+                continue
+            changes = [
+                (begin, end, new_text)
+                for begin, end, new_text in map(detector.replacement, detector.finditer(block))
+                if new_text != block[begin:end]
+            ]
+            if changes:
+                # A replacement may create or break a match of the next detectors, e.g: the
+                # context of their regexes can reach any distance, so they run on the new block
+                block = apply_replacements(block, changes)
+                # The new texts may bring triggers
+                triggers = scan_triggers(block)
+        return block
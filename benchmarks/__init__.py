@@ -0,0 +1 @@
+"""Benchmarks of the anonymizer, run them with: python -m benchmarks.<name>."""
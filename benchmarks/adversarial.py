@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Every detector of anonymize_text_block() must keep a bounded time per byte.
+
+The patterns are repeated up to the input size, they target the backtracking
+of the regexes. The benchmark exits with an error if the time per byte of a
+detector grows by more than MAX_GROWTH between the smallest and the largest input.
+"""
+import sys
+
+from ansible_anonymizer.anonymizer import text_scanner
+from ansible_anonymizer.scanner import Scanner
+
+from .common import growth, repeat_to_size, report, scaling
+
+# A linear detector stays around x1, a quadratic one gets close to the ratio of the sizes
+MAX_GROWTH = 3.0
+
+ADVERSARIAL = [
+    # Emails, a long run of non-space characters
+    "a.",
+    "a.@",
+    "@a.",
+    "a@b_",
+    # User names, Jinja2 expressions that are never closed or span lines
+    "/home/{{",
+    "/home/{{ x\n",
+    "c:\\users\\{{ ",
+    "/home/{{x}}",
+    # IP and MAC addresses
+    "1:",
+    "a:",
+    "1.1.1.",
+    "aa-",
+    "aabb.",
+    # SSN, phone and credit card numbers
+    "123-45-",
+    "(555) ",
+    "1",
+    "1 ",
+    "1-",
+]
+
+
+def main() -> None:
+    """Run the benchmark, exit with 1 if a detector is not linear."""
+    sizes = [20_000, 200_000]
+    failures = []
+    for detector in text_scanner.detectors:
+        scanner = Scanner([detector])
+        for pattern in ADVERSARIAL:
+
+            def make_payload(size: int, pattern: str = pattern) -> str:
+                return repeat_to_size(pattern, size)
+
+            name = f"{detector.name}, {pattern!r}"
+            results = scaling(scanner.sub, make_payload, sizes)
+            report(name, results)
+            if growth(results) > MAX_GROWTH:
+                failures.append(name)
+    if failures:
+        print(f"The time per byte grows by more than x{MAX_GROWTH}:")
+        for name in failures:
+            print(f"  {name}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""anonymize_struct() on wide and deep structures, like the ansible_facts dumps."""
+import tracemalloc
+from collections.abc import Callable
+from functools import partial
+from string import Template
+from typing import Any
+
+from ansible_anonymizer.anonymizer import (
+    FieldMemo,
+    anonymize_field,
+    anonymize_struct,
+    anonymize_struct_in_place,
+)
+
+from .common import measure
+
+
+def legacy_anonymize_struct(o: Any, key_name: str = "", value_template: Any = None) -> Any:
+    """Return the result of the previous, recursive, implementation."""
+    if not value_template:
+        value_template = Template("{{ $variable_name }}")
+
+    def key_name_str(k: Any) -> str:
+        return k if isinstance(k, str) else ""
+
+    if isinstance(o, dict):
+        return {
+            k: legacy_anonymize_struct(v, key_name_str(k), value_template) for k, v in o.items()
+        }
+    if isinstance(o, list):
+        return [legacy_anonymize_struct(v, key_name, value_template) for v in o]
+    if isinstance(o, str):
+        return anonymize_field(o, key_name, value_template)
+    return o
+
+
+def facts(size: int) -> dict[str, Any]:
+    """Return a structure similar to the facts of size hosts."""
+    return {
+        f"host{i}": {
+            "ansible_hostname": f"host{i}",
+            "ansible_processor_count": 4,
+            "ansible_interfaces": ["lo", "eth0"],
+            "ansible_mounts": [{"mount": "/", "size_total": 1 << 30, "fstype": "xfs"}],
+            "ansible_selinux": {"status": "enabled", "mode": "enforcing"},
+        }
+        for i in range(size)
+    }
+
+
+def inventory(size: int) -> dict[str, Any]:
+    """Return the host vars of size hosts, the same strings come back for each host."""
+    return {
+        f"host{i}": {
+            "ansible_host": "10.0.0.1",
+            "nginx_state": "present",
+            "nginx_conf": "/etc/nginx/nginx.conf",
+            "admin_email": "admin@example.com",
+            "admin_password": "hunter2",
+        }
+        for i in range(size)
+    }
+
+
+def deep(depth: int) -> list[Any]:
+    """Return lists nested depth times."""
+    o: list[Any] = ["leaf"]
+    for _ in range(depth):
+        o = [o, 1]
+    return o
+
+
+def peak_memory(func: Callable[[Any], Any], payload: Any) -> int:
+    """Return the peak of the memory allocated by func(payload), in bytes."""
+    tracemalloc.start()
+    func(payload)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def shared(o: Any) -> Any:
+    """Anonymize o, the result shares the unchanged containers with o."""
+    return anonymize_struct(o, share_unchanged=True)
+
+
+def main() -> None:
+    """Run the benchmark."""
+    payloads = {
+        "10k integers": list(range(10_000)),
+        "10k short strings": ["value"] * 10_000,
+        "facts of 2k hosts": facts(2_000),
+        "inventory of 2k hosts": inventory(2_000),
+        "300 levels": deep(300),
+    }
+    for name, payload in payloads.items():
+        print(f"{name}:")
+        print(f"  anonymize_struct {measure(anonymize_struct, payload):10.4f}s")
+        print(f"  recursive        {measure(legacy_anonymize_struct, payload):10.4f}s")
+        print(f"  share_unchanged  {measure(shared, payload):10.4f}s")
+        print(f"  in place         {measure(anonymize_struct_in_place, payload):10.4f}s")
+    for func in (anonymize_struct, shared, anonymize_struct_in_place):
+        peak = peak_memory(func, payloads["facts of 2k hosts"])
+        print(f"peak memory of {func.__name__}() on the facts: {peak / 1e6:.1f}MB")
+    # A new one, the in place benchmark changed the first one
+    hosts = inventory(2_000)
+    memo: FieldMemo = {}
+    anonymize_struct(hosts, memo=memo)
+    duration = measure(partial(anonymize_struct, memo=memo), hosts)
+    print(f"inventory of 2k hosts, with the memo of a previous call: {duration:.4f}s")
+    print("100k levels:")
+    print(f"  anonymize_struct {measure(anonymize_struct, deep(100_000)):10.4f}s")
+
+
+if __name__ == "__main__":
+    main()
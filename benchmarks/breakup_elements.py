@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+"""breakup_elements() must scale linearly, even when a quote is never closed."""
+
+from ansible_anonymizer.parser import breakup_elements
+
+from .common import repeat_to_size, report, scaling
+
+SAMPLE = """- name: "Install the packages"
+  ansible.builtin.package:
+    name: '{{ item }}'
+  vars:
+    password: "my_secret"
+    msg: it's a long line without the closing quote
+"""
+
+
+def main() -> None:
+    """Run the benchmark."""
+    sizes = [1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+    report(
+        "breakup_elements", scaling(breakup_elements, lambda s: repeat_to_size(SAMPLE, s), sizes)
+    )
+
+
+if __name__ == "__main__":
+    main()
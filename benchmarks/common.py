@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""Helpers shared by the benchmarks."""
+import timeit
+from collections.abc import Callable, Sequence
+from typing import Any
+
+# (input size in bytes, best time in seconds)
+Measure = tuple[int, float]
+
+
+def measure(func: Callable[[Any], Any], payload: Any, repeat: int = 3) -> float:
+    """Return the best execution time of func(payload), in seconds."""
+    return min(timeit.repeat(lambda: func(payload), number=1, repeat=repeat))
+
+
+def scaling(
+    func: Callable[[str], Any], make_payload: Callable[[int], str], sizes: Sequence[int]
+) -> list[Measure]:
+    """Run func() on payloads of increasing sizes."""
+    results: list[Measure] = []
+    for size in sizes:
+        payload = make_payload(size)
+        results.append((len(payload), measure(func, payload)))
+    return results
+
+
+def growth(results: list[Measure]) -> float:
+    """Return how much the time per byte grew between the smallest and the largest input."""
+    first_size, first_time = results[0]
+    last_size, last_time = results[-1]
+    return (last_time / last_size) / (first_time / first_size)
+
+
+def report(name: str, results: list[Measure]) -> None:
+    """Print the time per byte for each size."""
+    print(f"{name}:")
+    for size, duration in results:
+        print(f"  {size:>12} bytes {duration:10.4f}s {duration / size * 1e9:10.1f} ns/byte")
+    print(f"  time per byte growth: x{growth(results):.2f}")
+
+
+def repeat_to_size(pattern: str, size: int) -> str:
+    """Repeat pattern up to size characters."""
+    return (pattern * (size // len(pattern) + 1))[:size]
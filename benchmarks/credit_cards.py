@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""hide_credit_cards() must keep a bounded time per byte on the long runs of digits."""
+from ansible_anonymizer.anonymizer import credit_card_detector, hide_credit_cards
+from ansible_anonymizer.scanner import RegexDetector, Scanner
+
+from .common import repeat_to_size, report, scaling
+
+# Inputs that are made of digits and separators
+ADVERSARIAL = {
+    "serial numbers": "1234567890",
+    "epoch timestamps": "1709296497012 ",
+    "spaced digits": "1 ",
+    "dashed digits": "1-",
+    "separator runs": "1   -  - ",
+    "hex dump": "0a1b 2c3d 4e5f 6789 ",
+    "12 digits": "x1 2 3 4 5 6 7 8 9 0 1 2 ",
+}
+
+# The previous implementation, with lazy quantifiers
+legacy_scanner = Scanner(
+    [
+        RegexDetector(
+            "credit_card",
+            r"(?P<before>([^\d-]|^))(?P<cc>(?:\d[ -]*?){13,16})(?P<after>([^\d-]|$))",
+            credit_card_detector.rewrite,
+            flags=credit_card_detector.regex.flags,
+            group="cc",
+        )
+    ]
+)
+
+
+def main() -> None:
+    """Run the benchmark."""
+    sizes = [10_000, 100_000, 1_000_000]
+    for name, pattern in ADVERSARIAL.items():
+
+        def make_payload(size: int, pattern: str = pattern) -> str:
+            return repeat_to_size(pattern, size)
+
+        report(f"hide_credit_cards, {name}", scaling(hide_credit_cards, make_payload, sizes))
+        report(f"lazy quantifiers, {name}", scaling(legacy_scanner.sub, make_payload, sizes))
+
+
+if __name__ == "__main__":
+    main()
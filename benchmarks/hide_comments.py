@@ -0,0 +1,21 @@
+#!/usr/bin/env python3
+"""hide_comments() must scale linearly with the number of commented lines."""
+from ansible_anonymizer.anonymizer import hide_comments
+
+from .common import repeat_to_size, report, scaling
+
+SAMPLE = """# A comment
+- name: "a task # not a comment"
+  ansible.builtin.debug:  # a trailing comment
+    msg: 'it''s "quoted" #'
+"""
+
+
+def main() -> None:
+    """Run the benchmark."""
+    sizes = [10_000, 100_000, 1_000_000, 10_000_000]
+    report("hide_comments", scaling(hide_comments, lambda s: repeat_to_size(SAMPLE, s), sizes))
+
+
+if __name__ == "__main__":
+    main()
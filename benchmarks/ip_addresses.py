@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""hide_ip_addresses() must stay cheap on the hexadecimal words that are not addresses."""
+
+import ipaddress
+import random
+import re
+
+from ansible_anonymizer.anonymizer import (
+    common_ipv4_networks,
+    hide_ip_addresses,
+    ip_address_detector,
+    redact_ipv4_address,
+    redact_ipv6_address,
+)
+from ansible_anonymizer.networks import NetworkIndex
+from ansible_anonymizer.scanner import RegexDetector, Scanner
+
+from .common import measure, repeat_to_size, report, scaling
+
+SAMPLE = """bash-5.2.26-3.fc40.x86_64 sha256:9f86d081884c7d659a2feaa0c55ad015a3bf4f1b2b0b822cd1
+commit 3f2a9c1e4b7d8a0f6e5d4c3b2a1f0e9d8c7b6a5f add the cafe role, dead code removed
+  ansible.builtin.get_url: url=https://10.0.0.1/pkg checksum=md5:d41d8cd98f00b204e9800998ecf8427e
+  listen: "fe80::1ff:fe23:4567:890a" on 2024-03-01 with deadbeef and facade
+"""
+
+
+def _rewrite_with_exceptions(m: re.Match[str]) -> str:
+    try:
+        ip = ipaddress.ip_address(m.group("ip_address"))
+    except ValueError:
+        return m.group("ip_address")
+    if ip.version == 4:
+        return str(redact_ipv4_address(ip))
+    return str(redact_ipv6_address(ip))
+
+
+# The previous implementation, every candidate goes through ipaddress.ip_address()
+legacy_scanner = Scanner(
+    [
+        RegexDetector(
+            "ip_address",
+            ip_address_detector.regex.pattern,
+            _rewrite_with_exceptions,
+            flags=ip_address_detector.regex.flags,
+        )
+    ]
+)
+
+
+def allowlist_lookups() -> None:
+    """Compare the NetworkIndex with a linear scan, for an inventory of 100k hosts."""
+    rng = random.Random(0)  # noqa: S311
+    addresses = [ipaddress.IPv4Address(rng.getrandbits(32)) for _ in range(100_000)]
+    networks = common_ipv4_networks + [
+        ipaddress.IPv4Network((rng.getrandbits(32), 24), strict=False) for _ in range(100)
+    ]
+    index = NetworkIndex(4, networks)
+    linear = measure(
+        lambda values: [any(value in n for n in networks) for value in values], addresses
+    )
+    indexed = measure(lambda values: [int(value) in index for value in values], addresses)
+    print(f"allowlist of {len(networks)} networks, {len(addresses)} addresses:")
+    print(f"  linear scan {linear:10.4f}s")
+    print(f"  NetworkIndex {indexed:9.4f}s")
+
+
+def main() -> None:
+    """Run the benchmark."""
+    sizes = [10_000, 100_000, 1_000_000, 10_000_000]
+
+    def make_payload(size: int) -> str:
+        return repeat_to_size(SAMPLE, size)
+
+    report("hide_ip_addresses", scaling(hide_ip_addresses, make_payload, sizes))
+    report(
+        "ipaddress.ip_address() on each candidate", scaling(legacy_scanner.sub, make_payload, sizes)
+    )
+    allowlist_lookups()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""hide_us_phone_numbers() makes a single pass, even on inputs full of digits."""
+import re
+
+from ansible_anonymizer.anonymizer import hide_us_phone_numbers
+from ansible_anonymizer.scanner import RegexDetector, Scanner
+
+from .common import repeat_to_size, report, scaling
+
+SAMPLE = """2024-03-01 12:34:56.789 connect from 10.0.12.4:51234 to 10.0.0.1:443 pid=48213
+2024-03-01 12:34:57.012 request 1709296497012 took 1234ms, 20480 bytes, port 8080
+2024-03-01 12:34:58.345 callback to 914-499-1900 and (914) 499-1900 id 9144991900
+"""
+
+# The previous implementation, one detector and one pass per format
+legacy_scanner = Scanner(
+    [
+        RegexDetector(
+            "us_phone_number",
+            r"(?P<before>([^\d\.]|^))" + number + r"(?P<after>([^\d\.]|$))",
+            lambda m: "(311) 555-2368",
+            flags=re.MULTILINE | re.DOTALL | re.IGNORECASE,
+            group="number",
+        )
+        for number in [
+            r"(?P<number>\d{10})",
+            r"(?P<number>1\d{10})",
+            r"(?P<number>\d{3}-\d{3}-\d{4})",
+            r"(?P<number>\d{3} \d{3}-\d{4})",
+            r"(?P<number>\(\d{3}\) \d{3}-\d{4})",
+        ]
+    ]
+)
+
+
+def main() -> None:
+    """Run the benchmark."""
+    sizes = [10_000, 100_000, 1_000_000, 10_000_000]
+
+    def make_payload(size: int) -> str:
+        return repeat_to_size(SAMPLE, size)
+
+    report("hide_us_phone_numbers", scaling(hide_us_phone_numbers, make_payload, sizes))
+    report("five passes, one per format", scaling(legacy_scanner.sub, make_payload, sizes))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+# pylint: disable=protected-access
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from string import Template
+
+from ansible_anonymizer.aio import AsyncAnonymizer
+from ansible_anonymizer.anonymizer import anonymize_struct, anonymize_text_block
+
+
+def test_async_anonymize_text_block():
+    block = (
+        "- name: a task # a comment\r\n"
+        '  foo: "multi\n'
+        '  lines password: bar"\n'
+        "  my_password: |\n"
+        "    line1\n"
+        "  ip: 192.168.10.34\n"
+    ) * 20
+    anonymizer = AsyncAnonymizer(chunk_size=100)
+    assert asyncio.run(anonymizer.anonymize_text_block(block)) == anonymize_text_block(block)
+    assert asyncio.run(anonymizer.anonymize_text_block("")) == ""
+    value_template = Template("--")
+    assert asyncio.run(anonymizer.anonymize_text_block("secret: a", value_template)) == (
+        'secret: "--"'
+    )
+
+
+def test_async_anonymize_struct():
+    struct = {"password": "foo", "a": ["my-email@address.com"]}
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        anonymizer = AsyncAnonymizer(executor=executor)
+        assert asyncio.run(anonymizer.anonymize_struct(struct)) == anonymize_struct(struct)
+
+
+def test_async_max_concurrency():
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def job():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.01)
+        with lock:
+            running.pop()
+
+    async def run_all(anonymizer):
+        await asyncio.gather(*(anonymizer._run(job) for _ in range(10)))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        asyncio.run(run_all(AsyncAnonymizer(executor=executor, max_concurrency=2)))
+    assert len(peak) == 10
+    assert max(peak) == 2
+
+
+def test_async_several_loops():
+    async def run_all(anonymizer):
+        return await asyncio.gather(
+            *(anonymizer.anonymize_text_block(f"password: {i}") for i in range(10))
+        )
+
+    anonymizer = AsyncAnonymizer(max_concurrency=2)
+    # A new loop each time, like the successive calls of asyncio.run()
+    for _ in range(2):
+        assert asyncio.run(run_all(anonymizer)) == ['password: "{{ password }}"'] * 10
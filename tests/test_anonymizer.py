@@ -2,15 +2,30 @@
 # pylint: disable=missing-module-docstring
 # pylint: disable=missing-function-docstring
 # pylint: disable=R0801
-from ipaddress import IPv4Address, IPv4Network, IPv6Address
+from ipaddress import IPv4Address, IPv4Network, IPv6Address, IPv6Network
 from string import Template
 from textwrap import dedent
 
+import pytest
+import yaml
+
+from ansible_anonymizer import anonymizer
 from ansible_anonymizer.anonymizer import (
+    CircularReferenceError,
+    _cannot_hold_pii,
+    _luhn_checksum_is_valid,
+    _parse_ipv4,
+    _parse_ipv6,
+    allow_ip_network,
     anonymize,
     anonymize_field,
+    anonymize_segment,
     anonymize_struct,
+    anonymize_struct_in_place,
     anonymize_text_block,
+    anonymize_text_stream,
+    common_ipv4_networks,
+    common_ipv6_networks,
     hide_comments,
     hide_credit_cards,
     hide_emails,
@@ -19,11 +34,14 @@ from ansible_anonymizer.anonymizer import (
     hide_us_phone_numbers,
     hide_us_ssn,
     hide_user_name,
+    iter_segments,
     redact_ip_address,
     redact_ipv4_address,
     redact_ipv6_address,
+    text_scanner,
     unquote,
 )
+from ansible_anonymizer.networks import NetworkIndex
 
 
 def test_redact_ipv4_address():
@@ -39,11 +57,89 @@ def test_redact_ipv6_address():
     assert IPv6Address(redact_ipv6_address(IPv6Address("2001:db8:3333:4444:5555:6666:7777:8888")))
 
 
+def test_redact_ip_address_as_integers():
+    assert redact_ipv4_address(IPv4Address("239.255.255.255")) == IPv4Address("240.0.0.38")
+    assert redact_ipv6_address(IPv6Address("::ffff:1.2.3.4")) == IPv6Address("::3ff:102:304")
+    assert redact_ipv6_address(IPv6Address("fe80::1234")) == IPv6Address("fe80::234")
+
+
+def test_allow_ip_network(monkeypatch):
+    monkeypatch.setattr(anonymizer, "ipv4_allowlist", NetworkIndex(4, common_ipv4_networks))
+    monkeypatch.setattr(anonymizer, "ipv6_allowlist", NetworkIndex(6, common_ipv6_networks))
+    assert redact_ip_address("10.1.2.3") == "10.1.2.14"
+    allow_ip_network("10.1.0.0/16")
+    allow_ip_network(IPv6Network("fd00::/8"))
+    assert redact_ip_address("10.1.2.3") == "10.1.2.3"
+    assert redact_ip_address("10.2.2.3") == "10.2.2.50"
+    assert redact_ip_address("fd12::1234") == "fd12::1234"
+    assert redact_ip_address("8.8.8.8") == "8.8.8.8"
+
+
 def test_redact_ip_address():
     assert redact_ip_address("2001:4860:4860::8888") == "2001:4860:4860::8888"
     assert IPv4Address(redact_ip_address("8.8.8.9"))
 
 
+@pytest.mark.parametrize(
+    "value",
+    [
+        "0.0.0.1",
+        "10.0.0.1",
+        "255.255.255.255",
+        "256.1.1.1",
+        "01.2.3.4",
+        "1.2.3",
+        "1.2.3.4.5",
+        "1..3.4",
+        "\u0661.2.3.4",
+    ],
+)
+def test_parse_ipv4(value):
+    try:
+        expected = IPv4Address(value)
+    except ValueError:
+        expected = None
+    assert _parse_ipv4(value) == expected
+
+
+@pytest.mark.parametrize(
+    "value",
+    [
+        "::",
+        "::1",
+        "1::",
+        "fe80::1ff:fe23:4567:890A",
+        "1:2:3:4:5:6:7:8",
+        "1:2:3:4:5:6:7::",
+        "::2:3:4:5:6:7:8",
+        "1:2:3:4:5:6:7::8",
+        "1:2:3:4:5:6:7",
+        "1:2:3:4:5:6:7:8:9",
+        ":1::2",
+        "1::2:",
+        ":1:2:3:4:5:6:7",
+        "1:::2",
+        "1::2::3",
+        "12345::",
+        "cafe",
+        "::\u0661",
+    ],
+)
+def test_parse_ipv6(value):
+    try:
+        expected = IPv6Address(value)
+    except ValueError:
+        expected = None
+    assert _parse_ipv6(value) == expected
+
+
+def test_hide_ip_addresses_hexadecimal_words():
+    source = "cafe dead:beef 3f2a9c1e4b7d8a0f fe80::1:1234 300.1.2.3 10.0.0.1"
+    assert hide_ip_addresses(source) == (
+        "cafe dead:beef 3f2a9c1e4b7d8a0f fe80::1:234 300.1.2.3 10.0.0.62"
+    )
+
+
 def test_anonymize_struct_nested_struct():
     in_ = {
         "name": "Install nginx and nodejs 12",
@@ -68,6 +164,126 @@ def test_anonymize_struct_ip_addresses():
     assert changed["a_module"]["password"] == "{{ password }}"
 
 
+def test_anonymize_struct_tuples():
+    in_ = {"password": ("first_password", ["second_password"]), "a_set": (1, "foo")}
+    assert anonymize_struct(in_) == {
+        "password": ("{{ password }}", ["{{ password }}"]),
+        "a_set": (1, "foo"),
+    }
+    assert anonymize_struct(("a", ("b",)), key_name="secret") == (
+        "{{ secret }}",
+        ("{{ secret }}",),
+    )
+
+
+def test_anonymize_struct_deep():
+    in_: list = ["foo@montreal.ca"]
+    for _ in range(100_000):
+        in_ = [in_, {"password": "bar"}]
+    changed = anonymize_struct(in_)
+    for _ in range(100_000):
+        assert changed[1] == {"password": "{{ password }}"}
+        changed = changed[0]
+    assert changed[0] != "foo@montreal.ca"
+
+
+def test_anonymize_struct_shared_and_circular():
+    shared = {"password": "foo"}
+    expected = {"password": "{{ password }}"}
+    assert anonymize_struct([shared, [shared]]) == [expected, [expected]]
+    circular: list = ["foo"]
+    circular.append({"a": circular})
+    with pytest.raises(CircularReferenceError):
+        anonymize_struct(circular)
+
+
+def test_anonymize_struct_in_place_shared():
+    # A YAML alias, the same dict is reachable from 3 parents
+    struct = yaml.safe_load("{defaults: &d {ip: 192.168.1.12}, host1: *d, host2: *d}")
+    expected = anonymize_struct(struct)
+    assert anonymize_struct_in_place(struct) == 1
+    assert struct == expected
+    assert struct["host1"] is struct["defaults"]
+    shared = ["foo", ("bar",)]
+    struct = {"password": [shared, (shared,)]}
+    assert anonymize_struct_in_place(struct) == 2
+    assert shared == ["{{ password }}", ("{{ password }}",)]
+    assert struct["password"] == [shared, (shared,)]
+    assert struct["password"][1][0] is shared
+
+
+def test_anonymize_struct_share_unchanged():
+    in_ = {
+        "apt": {"name": ["nginx", "nodejs"], "state": "latest"},
+        "vars": [{"password": "foo"}, ("a", "b")],
+    }
+    changed = anonymize_struct(in_, share_unchanged=True)
+    assert changed == anonymize_struct(in_)
+    assert changed is not in_
+    assert changed["apt"] is in_["apt"]
+    assert changed["vars"] is not in_["vars"]
+    assert changed["vars"][0] == {"password": "{{ password }}"}
+    assert changed["vars"][1] is in_["vars"][1]
+    assert in_["vars"][0] == {"password": "foo"}
+    assert anonymize_struct(in_["apt"], share_unchanged=True) is in_["apt"]
+    assert anonymize_struct(in_)["apt"] is not in_["apt"]
+
+
+def test_anonymize_struct_in_place():
+    apt = {"name": ["nginx", "nodejs"], "state": "latest"}
+    variables = [{"password": "foo"}, ("a", ["b"]), ("c", "d")]
+    in_ = {"apt": apt, "vars": variables, "secret": ("e", "f")}
+    expected = anonymize_struct(in_)
+    tuple_with_list = variables[1]
+    assert anonymize_struct_in_place(in_) == 3
+    assert in_ == expected
+    assert in_["apt"] is apt
+    assert in_["vars"] is variables
+    assert in_["vars"][1] is tuple_with_list
+    assert in_["secret"] == ("{{ secret }}", "{{ secret }}")
+    assert anonymize_struct_in_place(in_) == 0
+    assert anonymize_struct_in_place(["a", "b"], key_name="password") == 2
+
+
+@pytest.mark.parametrize("in_", ["password", ("a", "b"), 1, None])
+def test_anonymize_struct_in_place_not_a_container(in_):
+    with pytest.raises(TypeError):
+        anonymize_struct_in_place(in_)
+
+
+def test_anonymize_struct_memo(monkeypatch):
+    calls = []
+
+    def fake_anonymize_field(value, name, value_template):
+        calls.append((value, name))
+        return anonymize_field(value, name, value_template)
+
+    monkeypatch.setattr(anonymizer, "anonymize_field", fake_anonymize_field)
+    hosts = [
+        {"email": "foo@montreal.ca", "password": "bar", "db_password": "bar", "state": "present"},
+        {"email": "foo@montreal.ca", "password": "bar", "db_password": "bar", "state": "present"},
+    ]
+    expected = anonymize_struct(hosts[0])
+    calls.clear()
+    changed = anonymize_struct(hosts)
+    assert len(calls) == 4
+    assert changed == [expected, expected]
+    assert changed[0]["email"] is changed[1]["email"]
+    assert changed[0]["password"] == "{{ password }}"
+    assert changed[0]["db_password"] == "{{ db_password }}"
+
+    memo: dict = {}
+    calls.clear()
+    anonymize_struct(hosts[0], memo=memo)
+    anonymize_struct(hosts[1], memo=memo)
+    anonymize_struct_in_place(hosts, memo=memo)
+    assert len(calls) == 4
+    assert hosts == changed
+    assert anonymize_struct({"password": "bar"}, value_template=Template("ö"), memo=memo) == {
+        "password": "ö"
+    }
+
+
 def test_anonymize_multiple_passwords():
     in_ = {"password": ["first_password", "second_password"]}
     assert anonymize_struct(in_) == {"password": ["{{ password }}", "{{ password }}"]}
@@ -138,6 +354,19 @@ def test_anonymize_text_block_no_change():
     assert anonymize_text_block(dedent(source)) == dedent(source)
 
 
+@pytest.mark.parametrize(
+    "source,expectation",
+    [
+        # The new IP address changes the context of the next detectors
+        ("ip: ::1123-45-6789", "ip: ::{{ ssn }}"),
+        ("id: 41111111111111110011.2233.4455", "id: {{ credit_card_number }}aabb.ccdd.eeff"),
+        ("x ::1555-123-4567", "x ::(311) 555-2368"),
+    ],
+)
+def test_anonymize_text_block_match_after_a_replacement(source, expectation):
+    assert anonymize_text_block(source) == expectation
+
+
 def test_anonymize_text_block_secret_fields():
     source = """
 
@@ -299,6 +528,12 @@ def test_anonymize_text_block_us_phone_numbers():
     assert anonymize_text_block(source) == expectation
     assert hide_us_phone_numbers(source) == expectation
     assert hide_us_phone_numbers("914-499-1900") == "(311) 555-2368"
+    assert hide_us_phone_numbers("9144991900 19144991900,914 499-1900") == (
+        "(311) 555-2368 (311) 555-2368,(311) 555-2368"
+    )
+    assert hide_us_phone_numbers("9144991900.1 91449919001 1.9144991900") == (
+        "9144991900.1 91449919001 1.9144991900"
+    )
 
 
 def test_anonymize_text_block_credit_cards():
@@ -334,6 +569,22 @@ def test_anonymize_text_block_credit_cards():
     assert anonymize_text_block(source) == expectation
     assert hide_credit_cards(source) == expectation
     assert hide_credit_cards("1234 5678 1234 5670") == "{{ credit_card_number }}"
+    # After 13 digits, a space ends the number
+    assert hide_credit_cards("4111 1111 1111 1111 22") == "{{ credit_card_number }} 22"
+    assert hide_credit_cards("4111-1111-1111-1111-") == "{{ credit_card_number }}"
+    # More than 16 digits without any space
+    assert hide_credit_cards("4111-1111-1111-1111-2") == "4111-1111-1111-1111-2"
+    assert hide_credit_cards("41111111111111112") == "41111111111111112"
+    assert hide_credit_cards("\u0664111111111111111") == "{{ credit_card_number }}"
+
+
+def test_luhn_checksum():
+    assert _luhn_checksum_is_valid("4111111111111111")
+    assert _luhn_checksum_is_valid("79927398713")
+    assert not _luhn_checksum_is_valid("79927398710")
+    assert _luhn_checksum_is_valid(
+        "\u0667\u0669\u0669\u0662\u0667\u0663\u0669\u0668\u0667\u0661\u0663"
+    )
 
 
 def test_anonymize_text_block_comments():
@@ -365,6 +616,12 @@ def test_anonymize_comment_with_quote():
     assert hide_comments(source) == ""
 
 
+def test_hide_comments_nested_quotes():
+    assert hide_comments("a: 'b \"c # d\" e'  # f") == "a: 'b \"c # d\" e'"
+    assert hide_comments("a: 'b' # c\n'# d'\n  # e") == "a: 'b'\n'# d'\n"
+    assert hide_comments("no comment") == "no comment"
+
+
 def test_anonymize_text_block_user_name():
     source = """
     "documentUri": "file:///home/pierre-yves/git_repos/ansible-collections/tag_operations.yml"
@@ -429,6 +686,45 @@ def test_anonymize_text_block_username_as_jinja_template_for_windows_path():
     )
 
 
+@pytest.mark.parametrize(
+    "source,expectation",
+    [
+        ("/home/{{\n bob }}/x", "/home/{{\n bob }}/x"),
+        ("/home/{{ bob\n }}/x", "/home/{{ bob\n }}/x"),
+        ("/home/{{ b\nob }}/x", "/home/ano-user{{ b\nob }}/x"),
+        ("/home/{{ bob/x", "/home/ano-user{{ bob/x"),
+        ("/home/bob{{ x }}y/z", "/home/ano-user/z"),
+        ("/home/{{ x }}{{ y }}/z", "/home/{{ x }}{{ y }}/z"),
+    ],
+)
+def test_hide_user_name_jinja_expressions(source, expectation):
+    assert hide_user_name(source) == expectation
+
+
+@pytest.mark.parametrize(
+    "source,span",
+    [
+        ("a@b.com@c.org", (0, 13)),
+        ("x,a@b.c.com1", None),
+        ("@a.com", None),
+        ("a@b.cd_e", None),
+        ("a@b.cd.e_", (0, 6)),
+        ("é@b.cd", (0, 6)),
+        ("-a@b.cd", (1, 7)),
+    ],
+)
+def test_email_detector_span(source, span):
+    spans = [m.span("email") for m in anonymizer.email_detector.finditer(source)]
+    assert spans == ([span] if span else [])
+
+
+def test_detectors_linear_time():
+    # The time of the regexes was quadratic with these inputs
+    assert hide_emails("a." * 50_000 + "@") == "a." * 50_000 + "@"
+    assert hide_user_name("/home/{{" * 50_000) == "/home/ano-user{{" * 50_000
+    assert hide_user_name("c:\\users\\{{ x\n" * 50_000) == "c:\\users\\ano-user{{ x\n" * 50_000
+
+
 def test_anonymize_field():
     field = "my_field"
     value = "     a    "
@@ -437,6 +733,42 @@ def test_anonymize_field():
     assert anonymize_field(value, field, value_template) == value
 
 
+@pytest.mark.parametrize(
+    "value,fast_path",
+    [
+        ("latest", True),
+        ("/etc/nginx/nginx.conf", True),
+        ("web.example.com", True),
+        ("Hello, World!", True),
+        ("{{ nginx_state }}", True),
+        ("", True),
+        ("nginx-1.24", False),
+        ("foo@example.com", False),
+        ("key: value", False),
+        ("a=b", False),
+        ("latest # comment", False),
+        ("aa-bb-cc-dd-ee-ff", False),
+        ("aabb.ccdd.eeff", False),
+        ("/Users/bob", False),
+        ("C:\\Users\\bob", False),
+        ("\u0661\u0662\u0663", False),
+    ],
+)
+def test_cannot_hold_pii(value, fast_path):
+    value_template = Template("{{ $variable_name }}")
+    assert _cannot_hold_pii(value) is fast_path
+    if fast_path:
+        assert anonymize_text_block(value) == value
+        assert anonymize_field(value, "my_field", value_template) == value
+
+
+def test_anonymize_field_fast_path():
+    value_template = Template("{{ $variable_name }}")
+    assert anonymize_field("latest", "my_field", value_template) == "latest"
+    # The value of a password field is hidden, even if it cannot hold any other PII
+    assert anonymize_field("latest", "password", value_template) == "{{ password }}"
+
+
 def test_unquote():
     assert unquote("'a'") == "a"
     assert unquote('"a"') == "a"
@@ -560,3 +892,87 @@ def test_anonymize_multi_lines():
     """
 
     assert anonymize_text_block(origin) == expectation
+
+
+def test_text_scanner_same_as_hide_functions():
+    source = """
+    - name: "Contact foo@bar.ca or (914) 499-1900"
+      ip: 192.168.10.34, fda4:597b:21fc:d31f::
+      ssn: "078-05-1120"
+      mac: a0:36:9f:0e:9d:78
+      cc: 1234 5678 1234 5670
+      path: /home/marie-pier/.ssh
+      ids: dead beef cafe 2024-01-01 1.2.3
+    """
+    block = source
+    for hide in [
+        hide_emails,
+        hide_ip_addresses,
+        hide_us_ssn,
+        hide_mac_addresses,
+        hide_us_phone_numbers,
+        hide_credit_cards,
+        hide_user_name,
+    ]:
+        block = hide(block)
+    assert text_scanner.sub(source) == block
+    assert block != source
+
+
+def test_text_scanner_reads_previous_replacements():
+    # The user name detector must see the phone number once it is anonymized
+    source = "/home/bob-9144991900"
+    assert text_scanner.sub(source) == "/home/ano-user(311) 555-2368"
+
+
+def test_anonymize_text_stream():
+    source = dedent("""
+        - name: a task # with a comment
+          my_password: |
+            line1
+
+          foo: "multi
+          lines password: bar"
+          a_module:
+            ip: 192.168.10.34
+            secret: foobar
+        something: "never closed
+        key: value""")
+    lines = list(anonymize_text_stream(source.splitlines(keepends=True)))
+    assert "".join(lines) == anonymize_text_block(source)
+    assert all(line.endswith("\n") for line in lines[:-1])
+    assert lines[:3] == ["\n", "- name: a task\n", '  my_password: "{{ my_password }}"\n']
+
+
+def test_iter_segments():
+    source = ['a: "x # y\n', 'password: z"\n', "ip: 10.0.0.1 # a comment\n"]
+    segments = list(iter_segments(source, max_lookahead=0))
+    assert segments == ['a: "x # y\npassword: z"\n', "ip: 10.0.0.1\n"]
+    template = Template("{{ $variable_name }}")
+    assert "".join(anonymize_segment(s, template) for s in segments) == anonymize_text_block(
+        "".join(source)
+    )
+
+
+@pytest.mark.parametrize(
+    "header,footer",
+    [
+        ("password: |\n", ""),
+        ('password: "\n', '"\n'),
+    ],
+)
+def test_anonymize_text_stream_long_secret(header, footer):
+    source = [header, *["  s3cr3t\n"] * 1200, footer]
+    lines = list(anonymize_text_stream(source))
+    assert "".join(lines) == anonymize_text_block("".join(source))
+    assert not [line for line in lines if "s3cr3t" in line]
+
+
+def test_anonymize_text_stream_max_lookahead():
+    source = ['password: "foo\n', 'bar"\n']
+    assert list(anonymize_text_stream(source)) == ['password: "{{ password }}"\n']
+    # The quoted string is cut
+    assert list(anonymize_text_stream(source, max_lookahead=1)) == [
+        'password: "{{ password }}"\n',
+        'bar"\n',
+    ]
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+from string import Template
+
+from ansible_anonymizer.anonymizer import anonymize_struct, anonymize_text_block
+from ansible_anonymizer.batch import AnonymizerPool, anonymize_item, anonymize_many
+
+
+def test_anonymize_item():
+    assert anonymize_item("password: foo") == anonymize_text_block("password: foo")
+    assert anonymize_item({"password": "foo"}) == anonymize_struct({"password": "foo"})
+    assert anonymize_item(1) == 1
+
+
+def test_anonymize_many():
+    items = [f"password: foo{i}\nip: 10.0.0.{i}" for i in range(50)]
+    items.insert(10, {"password": "foo", "email": "my-email@address.com"})
+    assert anonymize_many(items, jobs=2, chunksize=3) == [anonymize_item(i) for i in items]
+
+
+def test_anonymize_many_value_template():
+    value_template = Template("_${variable_name}_")
+    assert anonymize_many([{"password": "foo"}], jobs=1, value_template=value_template) == [
+        {"password": "_password_"}
+    ]
+
+
+def test_anonymizer_pool_reuse():
+    with AnonymizerPool(jobs=2, chunksize=2) as pool:
+        assert list(pool.anonymize_many(["password: a"] * 5)) == ['password: "{{ password }}"'] * 5
+        assert not list(pool.anonymize_many(iter([])))
+        assert list(pool.anonymize_many(iter([{"secret": "b"}]))) == [{"secret": "{{ secret }}"}]
+
+    with AnonymizerPool(jobs=1, chunksize=0) as pool:
+        assert list(pool.anonymize_many(["a", "b"])) == ["a", "b"]
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+from ipaddress import IPv4Address
+from string import Template
+
+import pytest
+
+from ansible_anonymizer import cache as cache_module
+from ansible_anonymizer.anonymizer import (
+    CircularReferenceError,
+    anonymize_struct,
+    anonymize_text_block,
+)
+from ansible_anonymizer.cache import (
+    CacheInfo,
+    DiskCache,
+    ResultCache,
+    _struct_key,
+    make_key,
+)
+
+
+def test_make_key():
+    assert make_key("ab", "c") != make_key("a", "bc")
+    assert make_key("ab", "c") == make_key("ab", "c")
+
+
+def test_result_cache_text_block():
+    cache = ResultCache()
+    block = "password: foo\nip: 10.0.0.1\n"
+    assert cache.anonymize_text_block(block) == anonymize_text_block(block)
+    assert cache.anonymize_text_block(block) == anonymize_text_block(block)
+    value_template = Template("--")
+    assert cache.anonymize_text_block(block, value_template) == (
+        anonymize_text_block(block, value_template)
+    )
+    assert cache.cache_info() == CacheInfo(hits=1, misses=2, evictions=0, currsize=2, maxsize=1024)
+
+
+def test_result_cache_struct():
+    cache = ResultCache()
+    struct = {"password": "foo", "a": [1, ("b", None)], 1: True}
+    first = cache.anonymize_struct(struct)
+    assert first == anonymize_struct(struct)
+    # The result is shared with the previous caller
+    assert cache.anonymize_struct(struct) is first
+    assert cache.anonymize_struct(struct, key_name="secret") == anonymize_struct(struct, "secret")
+    # The string keys and the int keys are different
+    assert cache.anonymize_struct({"1": True}) == {"1": True}
+    assert cache.cache_info().hits == 1
+    assert cache.cache_info().misses == 3
+
+
+def test_result_cache_struct_not_plain():
+    cache = ResultCache()
+    struct = {"ip": IPv4Address("10.0.0.1")}
+    assert cache.anonymize_struct(struct) == struct
+    assert cache.cache_info().currsize == 0
+
+
+def test_result_cache_struct_key():
+    shared = ["a"]
+    assert _struct_key([shared, shared]) == _struct_key([["a"], ["a"]])
+    assert _struct_key(["a", "b"]) != _struct_key(["ab"])
+    assert _struct_key([1]) != _struct_key([True])
+    assert _struct_key([1]) != _struct_key(["1"])
+    assert _struct_key([1]) != _struct_key((1,))
+    assert _struct_key({"a": "b"}) != _struct_key({"b": "a"})
+    assert _struct_key({"a": None}) != _struct_key(["a", None])
+
+
+def test_result_cache_struct_circular_reference():
+    cache = ResultCache()
+    struct = {"a": []}
+    struct["a"].append(struct)
+    with pytest.raises(CircularReferenceError):
+        cache.anonymize_struct(struct)
+    assert cache.cache_info().currsize == 0
+
+
+def test_result_cache_eviction():
+    cache = ResultCache(maxsize=2)
+    for block in ["a", "b", "a", "c", "b"]:
+        cache.anonymize_text_block(block)
+    assert cache.cache_info() == CacheInfo(hits=1, misses=4, evictions=2, currsize=2, maxsize=2)
+    cache.cache_clear()
+    assert cache.cache_info() == CacheInfo(hits=0, misses=0, evictions=0, currsize=0, maxsize=2)
+
+
+def test_disk_cache_get_set(tmp_path):
+    with DiskCache(tmp_path) as cache:
+        key = cache.key("a")
+        assert cache.get(key) is None
+        cache.set(key, "foo")
+        assert cache.get(key) == "foo"
+        cache.set(key, "barbaz")
+        assert cache.get(key) == "barbaz"
+        assert cache.cache_info() == CacheInfo(
+            hits=2, misses=1, evictions=0, currsize=6, maxsize=256 * 1024 * 1024
+        )
+
+
+def test_disk_cache_refresh_last_used(tmp_path):
+    with DiskCache(tmp_path) as cache:
+        key = cache.key("a")
+        cache.set(key, "foo")
+        statements = []
+        cache._connection.set_trace_callback(statements.append)  # pylint: disable=protected-access
+        assert cache.get(key) == "foo"
+        assert not [s for s in statements if s.startswith("UPDATE")]
+        # The entry is now too old
+        cache.refresh_interval = -1
+        assert cache.get(key) == "foo"
+        assert [s for s in statements if s.startswith("UPDATE")]
+
+
+def test_disk_cache_persistence(tmp_path):
+    block = "password: foo\nip: 10.0.0.1\n"
+    with DiskCache(tmp_path) as cache:
+        assert cache.anonymize_text_block(block) == anonymize_text_block(block)
+    with DiskCache(tmp_path) as cache, DiskCache(tmp_path) as other:
+        assert cache.anonymize_text_block(block) == anonymize_text_block(block)
+        value_template = Template("--")
+        assert other.anonymize_text_block(block, value_template) == (
+            anonymize_text_block(block, value_template)
+        )
+        assert cache.cache_info().hits == 1
+        assert other.cache_info().misses == 1
+        assert cache.cache_info().currsize == other.cache_info().currsize
+
+
+def test_disk_cache_eviction(tmp_path):
+    with DiskCache(tmp_path, max_size=10) as cache:
+        cache.eviction_batch = 1
+        for i in range(4):
+            cache.set(cache.key(str(i)), "abcd")
+        assert cache.get(cache.key("0")) is None
+        assert cache.get(cache.key("3")) == "abcd"
+        assert cache.cache_info().evictions == 2
+        assert cache.cache_info().currsize == 8
+
+
+def test_disk_cache_version(tmp_path, monkeypatch):
+    with DiskCache(tmp_path) as cache:
+        cache.set(cache.key("a"), "foo")
+        monkeypatch.setattr(cache_module, "__version__", "0.0.0-other")
+        assert cache.get(cache.key("a")) is None
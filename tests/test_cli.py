@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+import io
+import sys
+
+import pytest
+
+from ansible_anonymizer import cli
+from ansible_anonymizer.cache import DiskCache
+from ansible_anonymizer.cli import main
+
+
+def run(monkeypatch, capsys, *args, stdin=""):
+    monkeypatch.setattr(sys, "argv", ["ansible-anonymizer", *args])
+    monkeypatch.setattr(sys, "stdin", io.StringIO(stdin))
+    main()
+    return capsys.readouterr()
+
+
+def create_tree(tmp_path):
+    source = tmp_path / "source"
+    (source / "sub").mkdir(parents=True)
+    (source / ".git").mkdir()
+    (source / ".git" / "config").write_text("password: foo\n")
+    (source / "a.yml").write_text("password: foo\n")
+    (source / "sub" / "b.yml").write_text("ip: 10.0.0.1 # a comment\n")
+    (source / "binary").write_bytes(b"\xff\xfe")
+    return source
+
+
+def test_cli_stdin(monkeypatch, capsys):
+    assert run(monkeypatch, capsys, stdin="password: foo\n").out == 'password: "{{ password }}"\n'
+    assert run(monkeypatch, capsys, "-", stdin="password: foo\n").out == (
+        'password: "{{ password }}"\n'
+    )
+    assert run(monkeypatch, capsys, "--format", "yaml", stdin="password: foo\n").out == (
+        "{'password': '{{ password }}'}\n"
+    )
+
+
+def test_cli_files_to_stdout(monkeypatch, capsys, tmp_path):
+    source = create_tree(tmp_path)
+    captured = run(monkeypatch, capsys, str(source / "sub"), str(source / "a.yml"))
+    assert captured.out == 'ip: 10.0.0.62\npassword: "{{ password }}"\n'
+    assert not captured.err
+
+
+def test_cli_long_secret(monkeypatch, capsys, tmp_path):
+    big = tmp_path / "big.txt"
+    big.write_text("password: |\n" + "  s3cr3t\n" * 1200)
+    captured = run(monkeypatch, capsys, str(big))
+    assert captured.out == 'password: "{{ password }}"\n'
+
+
+@pytest.mark.parametrize("jobs", ["1", "2"])
+def test_cli_output_dir(monkeypatch, capsys, tmp_path, jobs):
+    source = create_tree(tmp_path)
+    output_dir = tmp_path / "output"
+    captured = run(
+        monkeypatch, capsys, str(source), "--output-dir", str(output_dir), "--jobs", jobs
+    )
+    assert (output_dir / "a.yml").read_text() == 'password: "{{ password }}"\n'
+    assert (output_dir / "sub" / "b.yml").read_text() == "ip: 10.0.0.62\n"
+    assert not (output_dir / ".git").exists()
+    assert not (output_dir / "binary").exists()
+    assert "binary: skipped" in captured.err
+    assert "2 files" in captured.err
+    assert "files/s" in captured.err
+    assert not captured.out
+
+
+def test_cli_output_dir_duplicate_destination(monkeypatch, capsys, tmp_path):
+    source = create_tree(tmp_path)
+    other = tmp_path / "other"
+    other.mkdir()
+    (other / "a.yml").write_text("password: bar\n")
+    output_dir = tmp_path / "output"
+    with pytest.raises(SystemExit):
+        run(monkeypatch, capsys, str(source), str(other), "--output-dir", str(output_dir))
+    assert "a.yml: several files would be written there" in capsys.readouterr().err
+    assert not output_dir.exists()
+
+
+def test_cli_stdin_and_files(monkeypatch, capsys, tmp_path):
+    source = create_tree(tmp_path)
+    with pytest.raises(SystemExit):
+        run(monkeypatch, capsys, "-", str(source / "a.yml"))
+    assert "- cannot be mixed with other paths" in capsys.readouterr().err
+
+
+def test_cli_cache_dir(monkeypatch, capsys, tmp_path):
+    source = create_tree(tmp_path)
+    cache_dir = tmp_path / "cache"
+    # The counters of each DiskCache when it is closed, at the end of each run
+    closed = []
+    close = DiskCache.close
+
+    def close_and_record(cache):
+        closed.append(cache.cache_info())
+        close(cache)
+
+    monkeypatch.setattr(DiskCache, "close", close_and_record)
+    for output_dir in [tmp_path / "first", tmp_path / "second"]:
+        run(
+            monkeypatch,
+            capsys,
+            str(source),
+            "--output-dir",
+            str(output_dir),
+            "--cache-dir",
+            str(cache_dir),
+        )
+        assert (output_dir / "a.yml").read_text() == 'password: "{{ password }}"\n'
+        assert (output_dir / "sub" / "b.yml").read_text() == "ip: 10.0.0.62\n"
+    assert [(info.hits, info.misses) for info in closed] == [(0, 2), (2, 0)]
+    assert not cli._disk_caches  # pylint: disable=protected-access
+
+
+def test_cli_in_place(monkeypatch, capsys, tmp_path):
+    source = create_tree(tmp_path)
+    (source / "a.yml").chmod(0o640)
+    run(monkeypatch, capsys, str(source), "--in-place")
+    assert (source / "a.yml").read_text() == 'password: "{{ password }}"\n'
+    assert (source / "a.yml").stat().st_mode & 0o777 == 0o640
+    assert (source / ".git" / "config").read_text() == "password: foo\n"
+    assert sorted(p.name for p in source.iterdir()) == [".git", "a.yml", "binary", "sub"]
+
+
+def test_cli_in_place_without_path(monkeypatch, capsys):
+    with pytest.raises(SystemExit):
+        run(monkeypatch, capsys, "--in-place")
@@ -34,6 +34,15 @@ def test_is_password_field_name():
     assert is_password_field_name("nopasswd") is True
 
 
+def test_is_password_field_name_cache():
+    is_password_field_name.cache_clear()
+    for _ in range(3):
+        assert is_password_field_name("name") is False
+        assert is_password_field_name("Password") is True
+    info = is_password_field_name.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (4, 2, 2)
+
+
 def test_is_path():
     assert is_path("/etc/fstab") is True
     assert is_path("./opt/fstab") is True
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+from ipaddress import IPv4Address, IPv4Network, IPv6Network
+
+import pytest
+
+from ansible_anonymizer.networks import NetworkIndex
+
+
+def test_network_index():
+    index = NetworkIndex(4, [IPv4Network("10.0.0.0/24"), IPv4Network("8.8.8.8/32")])
+    assert int(IPv4Address("10.0.0.0")) in index
+    assert int(IPv4Address("10.0.0.255")) in index
+    assert int(IPv4Address("10.0.1.0")) not in index
+    assert int(IPv4Address("8.8.8.8")) in index
+    assert int(IPv4Address("8.8.8.7")) not in index
+    assert 0 not in index
+    assert "10.0.0.1" not in index
+    assert len(index) == 2
+
+
+def test_network_index_merge():
+    index = NetworkIndex(4)
+    for network in ["10.0.2.0/24", "10.0.0.0/24", "10.0.0.128/25", "10.0.4.0/24", "10.0.1.0/24"]:
+        index.add(IPv4Network(network))
+    assert len(index) == 2
+    assert int(IPv4Address("10.0.1.12")) in index
+    assert int(IPv4Address("10.0.3.0")) not in index
+    index.add(IPv4Network("10.0.0.0/16"))
+    assert len(index) == 1
+    assert int(IPv4Address("10.0.3.0")) in index
+
+
+def test_network_index_version():
+    with pytest.raises(TypeError):
+        NetworkIndex(4, [IPv6Network("::1/128")])
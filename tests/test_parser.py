@@ -4,12 +4,14 @@
 
 from textwrap import dedent
 
+import pytest
+
 from ansible_anonymizer.parser import (
     NodeType,
     breakup_elements,
-    combinate_value_fields,
     flatten,
     parse_raw_block,
+    update_open_quotes,
 )
 
 
@@ -217,10 +219,11 @@ def test_parser_get_secret_with_unquoted_special_chars():
     root_node = breakup_elements(sample)
     field_name_node = root_node.next
     assert field_name_node.text == "config_reverseproxy_oauth_password"
-    # Without combinate_value_fields we only get the first node of the secret
+    # Without the combination of the value we only get the first node of the secret
     assert field_name_node.get_secret().text == "%"
-    combinate_value_fields(root_node)
-    assert field_name_node.get_secret().text == "%$#my_secret&"
+    nodes = list(flatten(parse_raw_block(sample)))
+    assert nodes[-1].secret_value_of is nodes[1]
+    assert nodes[-1].text == "%$#my_secret&"
 
 
 def test_parser_get_secret_with_ini_file():
@@ -233,18 +236,18 @@ def test_parser_get_secret_with_ini_file():
     [section.bar]
     George = # a comment
     """
-    root_node = breakup_elements(dedent(sample))
-    secret_node = [n for n in flatten(root_node) if n.text == "turbo_secret"][0]
-    # Without combinate_value_fields we only get the first node of the secret
-    combinate_value_fields(root_node)
-    assert secret_node.get_secret().text == "@#%$%^&^^ 645"
+    root_node = parse_raw_block(dedent(sample))
+    passwords = {
+        t.secret_value_of.text: t.text for t in flatten(root_node) if t.type is NodeType.secret
+    }
+    assert passwords == {"turbo_secret": "@#%$%^&^^ 645"}
 
 
 def test_combinate_value_fields():
     sample = "config_reverseproxy_oauth_password: my!secret%$!"
     root_node = breakup_elements(sample)
     assert len(list(flatten(root_node))) == 10
-    combinate_value_fields(root_node)
+    root_node = parse_raw_block(sample)
     assert len(list(flatten(root_node))) == 5
 
 
@@ -378,3 +381,119 @@ def test_parser_one_character_quoted_secret():
     ]
     nodes_found = list(flatten(root_node))
     assert nodes_found[-3].closed_by == nodes_found[-1]
+
+
+def test_parser_many_secrets():
+    sample = "".join(f'password{i}: "secret{i}"\napi_key{i}=value{i}\n' for i in range(5000))
+    root_node = parse_raw_block(sample)
+    secrets = [t.text for t in flatten(root_node) if t.type is NodeType.secret]
+    assert len(secrets) == 10000
+    assert secrets[-2:] == ["secret4999", "value4999"]
+
+
+@pytest.mark.parametrize(
+    "sample,expected",
+    [
+        (
+            'password: \\"my secret\\" key=\\\'foo',
+            [
+                ("password", NodeType.field, None),
+                (":", NodeType.separator, None),
+                (" ", NodeType.space, None),
+                ('\\"', NodeType.quoted_string_holder, None),
+                ("my secret", NodeType.secret, "password"),
+                ('\\"', NodeType.quoted_string_closing, None),
+                (" ", NodeType.space, None),
+                ("key", NodeType.field, None),
+                ("=", NodeType.separator, None),
+                ("\\", NodeType.unknown, None),
+                ("'", NodeType.unknown, None),
+                ("foo", NodeType.field, None),
+            ],
+        ),
+        (
+            "secret: a b password=c",
+            [
+                ("secret", NodeType.field, None),
+                (":", NodeType.separator, None),
+                (" ", NodeType.space, None),
+                ("a b password=c", NodeType.secret, "secret"),
+            ],
+        ),
+        (
+            "my_password: |\n  l1\n  l2\\'",
+            [
+                ("my_password", NodeType.field, None),
+                (":", NodeType.separator, None),
+                (" ", NodeType.space, None),
+                ("|\n  l1\n  l2\\'", NodeType.secret, "my_password"),
+            ],
+        ),
+        (
+            "password: api_key: x y secret=z",
+            [
+                ("password", NodeType.field, None),
+                (":", NodeType.separator, None),
+                (" ", NodeType.space, None),
+                ("api_key", NodeType.secret, "password"),
+                (":", NodeType.separator, None),
+                (" ", NodeType.space, None),
+                ("x y secret=z", NodeType.unknown, None),
+            ],
+        ),
+        (
+            "\"password\": \"api_key: 'x\" y'\\",
+            [
+                ('"', NodeType.quoted_string_holder, None),
+                ("password", NodeType.field, None),
+                ('"', NodeType.quoted_string_closing, None),
+                (":", NodeType.separator, None),
+                (" ", NodeType.space, None),
+                ('"', NodeType.quoted_string_holder, None),
+                ("api_key: 'x", NodeType.secret, "password"),
+                ('"', NodeType.quoted_string_closing, None),
+                (" ", NodeType.space, None),
+                ("y", NodeType.field, None),
+                ("'", NodeType.quoted_string_closing, None),
+                ("\\", NodeType.unknown, None),
+            ],
+        ),
+        (
+            "passwd: 'a' password: b",
+            [
+                ("passwd", NodeType.field, None),
+                (":", NodeType.separator, None),
+                (" ", NodeType.space, None),
+                ("'", NodeType.quoted_string_holder, None),
+                ("a", NodeType.secret, "passwd"),
+                ("'", NodeType.quoted_string_closing, None),
+                (" ", NodeType.space, None),
+                ("password", NodeType.field, None),
+                (":", NodeType.separator, None),
+                (" ", NodeType.space, None),
+                ("b", NodeType.secret, "password"),
+            ],
+        ),
+    ],
+)
+def test_parse_raw_block_nodes(sample, expected):
+    nodes = list(flatten(parse_raw_block(sample)))
+    assert (nodes[0].text, nodes[0].type) == ("", NodeType.quoted_string_holder)
+    found = [
+        (n.text, n.type, n.secret_value_of.text if n.type is NodeType.secret else None)
+        for n in nodes[1:]
+    ]
+    assert found == expected
+
+
+def test_update_open_quotes():
+    open_quotes: list[tuple[str, bool]] = []
+    update_open_quotes("a: \"b 'c\n", open_quotes)
+    assert open_quotes == [('"', False), ("'", False)]
+    update_open_quotes('\\"d\n', open_quotes)
+    assert open_quotes == [('"', False), ("'", False), ('"', True)]
+    # The second quote closes the first one, which is a closing quote
+    update_open_quotes("''\n", open_quotes)
+    assert open_quotes == [('"', False), ('"', True)]
+    update_open_quotes('\\"x"\n', open_quotes)
+    assert not open_quotes
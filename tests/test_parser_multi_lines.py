@@ -9,6 +9,7 @@ from ansible_anonymizer.parser import (
 )
 from ansible_anonymizer.parser_multi_lines import (
     group_multi_lines,
+    is_multi_lines_header,
 )
 
 
@@ -58,3 +59,11 @@ def test_parser_empty_multilines():
     group_multi_lines(root_node)
     nodes_found_after = list(flatten(root_node))
     assert [n.type for n in nodes_found_before] == [n.type for n in nodes_found_after]
+
+
+def test_is_multi_lines_header():
+    assert is_multi_lines_header("a: |\n") is True
+    assert is_multi_lines_header("  my_key: >\n") is True
+    assert is_multi_lines_header("a:  |\n") is False
+    assert is_multi_lines_header("a: |") is False
+    assert is_multi_lines_header("': |\n") is False
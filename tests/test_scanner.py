@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# pylint: disable=missing-module-docstring
+# pylint: disable=missing-function-docstring
+
+import pytest
+
+from ansible_anonymizer.scanner import (
+    Detector,
+    RegexDetector,
+    Scanner,
+    UnknownTriggerError,
+    apply_replacements,
+    scan_triggers,
+)
+
+
+def test_regex_detector_group():
+    detector = RegexDetector("number", r"\((?P<n>\d+)\)", lambda m: "X", group="n")
+    assert Scanner([detector]).sub("a (12) b (3)") == "a (X) b (X)"
+
+
+def test_scanner_no_change():
+    block = "nothing to see"
+    detector = RegexDetector("digit", r"\d", lambda m: "X")
+    assert Scanner([detector]).sub(block) is block
+
+
+def test_scanner_unchanged_match_is_ignored():
+    detector = RegexDetector("word", r"\w+", lambda m: m.group(0))
+    assert Scanner([detector]).sub("foo bar") == "foo bar"
+
+
+def test_scanner_independent_detectors():
+    first = RegexDetector("first", r"foo", lambda m: "FOO")
+    second = RegexDetector("second", r"bar", lambda m: "BAR")
+    assert Scanner([first, second]).sub("foo bar foo") == "FOO BAR FOO"
+
+
+def test_scanner_priority():
+    # The second detector sees the block as rewritten by the first one
+    first = RegexDetector("first", r"foo", lambda m: "bar")
+    second = RegexDetector("second", r"bar\w*", lambda m: "baz")
+    assert Scanner([first, second]).sub("foobar") == "baz"
+    assert Scanner([second, first]).sub("foobar") == "barbaz"
+
+
+def test_scanner_overlap():
+    first = RegexDetector("first", r"abc", lambda m: "X")
+    second = RegexDetector("second", r"cde", lambda m: "Y")
+    assert Scanner([first, second]).sub("abcde") == "Xde"
+    assert Scanner([second, first]).sub("abcde") == "abY"
+
+
+def test_scanner_match_created_by_a_replacement():
+    # The second detector only matches after the change of the first one
+    first = RegexDetector("first", r"a", lambda m: "1")
+    second = RegexDetector("second", r"(?<!\d)\d{2}(?!\d)", lambda m: "X")
+    assert Scanner([first, second]).sub("a2 12 123") == "X X 123"
+    assert Scanner([second, first]).sub("a2 12 123") == "12 X 123"
+
+
+def test_apply_replacements():
+    assert apply_replacements("abcdef", []) == "abcdef"
+    assert apply_replacements("abcdef", [(0, 1, "X"), (2, 2, "-"), (4, 6, "")]) == "Xb-cd"
+
+
+def test_detector_is_abstract():
+    class Incomplete(Detector):  # pylint: disable=missing-class-docstring,abstract-method
+        def finditer(self, block):
+            return iter([])
+
+    with pytest.raises(TypeError):
+        Detector("abstract")  # pylint: disable=abstract-class-instantiated
+    with pytest.raises(TypeError):
+        Incomplete("incomplete")  # pylint: disable=abstract-class-instantiated
+
+
+def test_scan_triggers():
+    assert scan_triggers("") == frozenset()
+    assert scan_triggers("a: b") == {":"}
+    assert scan_triggers("x@y.com # 2") == {"@", ".", "#", "digit"}
+    assert scan_triggers("C:\\USERS\\bob /Home/") == {":", "user_dir"}
+    assert scan_triggers("\u0661") == {"digit"}
+
+
+def test_detector_triggers():
+    calls = []
+
+    class CountingDetector(RegexDetector):
+        """Keep track of the blocks it reads."""
+
+        def finditer(self, block):
+            calls.append(block)
+            return super().finditer(block)
+
+    digit = CountingDetector("digit", r"\d", lambda m: "X", triggers=["digit", "-"])
+    assert Scanner([digit]).sub("abc") == "abc"
+    assert Scanner([digit]).sub("a-1") == "a-X"
+    assert calls == ["a-1"]
+    with pytest.raises(UnknownTriggerError):
+        RegexDetector("unknown", r"\d", lambda m: "X", triggers=["digits"])
+
+
+def test_triggers_after_a_rewrite():
+    first = RegexDetector("first", r"foo", lambda m: "f1", triggers=["-"])
+    second = RegexDetector("second", r"-f\w", lambda m: m.group(0).upper(), triggers=["-"])
+    third = RegexDetector("third", r"\d", lambda m: "X", triggers=["digit"])
+    # third has no digit in the original block, it only comes with the new text of first
+    assert Scanner([first, second, third]).sub("-foo") == "-FX"
+    assert Scanner([first, third]).sub("-foo") == "-fX"